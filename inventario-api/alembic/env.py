@@ -0,0 +1,51 @@
+"""
+ENTORNO DE ALEMBIC
+
+Conecta las migraciones con la app: usa el mismo engine (DATABASE_URL)
+y los mismos modelos que app/database.py.
+
+Las tablas nuevas las sigue creando init_db() al iniciar la app; las
+migraciones se encargan de los cambios sobre tablas que ya existen
+(create_all nunca modifica una tabla existente).
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import Base, engine
+from app.models import user, product, sale  # noqa: F401 (registra los modelos en Base)
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL de las migraciones sin conectarse (alembic upgrade --sql)."""
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True
+    )
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Aplica las migraciones sobre la base de datos."""
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
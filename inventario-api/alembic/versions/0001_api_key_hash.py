@@ -0,0 +1,74 @@
+"""Agrega users.api_key_hash a bases de datos existentes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+
+Las API Keys se buscan por su hash BLAKE2b (ver hash_api_key en
+app/auth.py). init_db() crea la columna en bases de datos nuevas, pero no
+la agrega a una tabla users que ya existía. Esta migración:
+
+1. Agrega la columna (permitiendo nulos)
+2. Calcula el hash de cada API Key existente con hash_api_key()
+3. La deja NOT NULL y con su índice único
+4. Borra el índice antiguo sobre api_key (ya no se busca por esa columna)
+
+Si la tabla no existe todavía, o ya tiene la columna (base creada por
+init_db después del cambio), no hace nada.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.auth import hash_api_key
+
+# Identificadores usados por Alembic
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Filas por cada UPDATE del relleno
+TAMANO_LOTE = 1000
+
+
+def upgrade() -> None:
+    conexion = op.get_bind()
+    inspector = sa.inspect(conexion)
+    # Base de datos nueva: init_db() creará la tabla completa al iniciar la app
+    if not inspector.has_table("users"):
+        return
+    
+    columnas = {columna["name"] for columna in inspector.get_columns("users")}
+    if "api_key_hash" in columnas:
+        return
+    
+    op.add_column("users", sa.Column("api_key_hash", sa.LargeBinary(16), nullable=True))
+    
+    # Rellenar el hash de las keys existentes, de a lotes
+    users = sa.table(
+        "users",
+        sa.column("id", sa.Integer),
+        sa.column("api_key", sa.String),
+        sa.column("api_key_hash", sa.LargeBinary)
+    )
+    actualizar = (
+        sa.update(users)
+        .where(users.c.id == sa.bindparam("user_id"))
+        .values(api_key_hash=sa.bindparam("hash"))
+    )
+    filas = conexion.execute(sa.select(users.c.id, users.c.api_key)).all()
+    for i in range(0, len(filas), TAMANO_LOTE):
+        conexion.execute(actualizar, [
+            {"user_id": user_id, "hash": hash_api_key(api_key)}
+            for user_id, api_key in filas[i:i + TAMANO_LOTE]
+        ])
+    
+    op.alter_column("users", "api_key_hash", nullable=False)
+    op.create_index("ix_users_api_key_hash", "users", ["api_key_hash"], unique=True)
+    op.execute("DROP INDEX IF EXISTS ix_users_api_key")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_api_key_hash", table_name="users")
+    op.drop_column("users", "api_key_hash")
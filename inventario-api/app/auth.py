@@ -14,12 +14,23 @@ CONCEPTOS:
 """
 
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status, Header
+from typing import NamedTuple, Optional
+import jwt
+from jwt import InvalidTokenError
+from cachetools import TTLCache
+import anyio
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import bcrypt
+import hashlib
+import os
 import secrets
+import threading
+import time
 
 from app.config import get_settings
 from app.database import get_db
@@ -29,13 +40,117 @@ from app.schemas import TokenData
 # Configuración
 settings = get_settings()
 
+# Valores de configuración que se usan en cada petición, leídos una sola vez
+_SECRET_KEY = settings.secret_key
+_ALGORITHM = settings.algorithm
+_ALGORITHMS = [settings.algorithm]
+_EXPIRE_SECONDS = settings.access_token_expire_minutes * 60
+
+# Límites para descartar credenciales mal formadas antes de hacer trabajo caro.
+# Nuestros JWT miden unos 200 caracteres; nada legítimo se acerca a 4096.
+_MAX_TOKEN_LENGTH = 4096
+# Largos válidos de API Key: "sk_" + 32 caracteres (actual) o + 43 (keys antiguas)
+_API_KEY_LENGTHS = frozenset({35, 46})
+
+# Error 401 que devolvemos cuando el token o la API Key no son válidos
+# (se crea una sola vez y se reutiliza en todas las peticiones)
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="No se pudo validar las credenciales",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
 # ============================================
 # CONFIGURACIÓN DE ENCRIPTACIÓN
 # ============================================
 
-# CryptContext maneja el "hash" de contraseñas con bcrypt
-# bcrypt es un algoritmo muy seguro para encriptar contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Por defecto las contraseñas nuevas se hashean con argon2id: a igual
+# seguridad es más rápido que bcrypt y además exige memoria, lo que
+# encarece los ataques con GPU. Se puede volver a bcrypt con
+# PASSWORD_SCHEME=bcrypt. Los hashes bcrypt antiguos se siguen aceptando
+# y se migran al algoritmo configurado la próxima vez que el usuario
+# inicia sesión (ver authenticate_user).
+PASSWORD_SCHEME = settings.password_scheme
+
+# argon2id con los parámetros recomendados por argon2-cffi
+_argon2 = PasswordHasher()
+
+# Para bcrypt, el "costo" define cuántas vueltas hace el algoritmo:
+# cada +1 duplica el tiempo de cálculo (y el esfuerzo de un atacante).
+BCRYPT_COST = settings.bcrypt_cost
+
+# argon2 y bcrypt tardan decenas o cientos de milisegundos por contraseña.
+# Para no bloquear el servidor, se calcula en hilos aparte, limitando
+# cuántos corren a la vez para no saturar la CPU.
+_hash_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+# ============================================
+# CACHÉ DE AUTENTICACIÓN
+# ============================================
+
+# Cada petición autenticada decodifica el JWT y busca al usuario en la BD.
+# Guardamos el resultado unos segundos para que las peticiones repetidas
+# del mismo cliente no repitan ese trabajo.
+# Las claves son el hash del token (nunca guardamos el token en texto plano).
+#
+# Las cachés son locales a cada proceso: en producción hay un worker por
+# núcleo (start_server.py) y no hay forma de invalidar una entrada en todos
+# a la vez. Por eso las API Keys no se guardan en caché: se
+# validan siempre contra la BD (consulta por índice sobre api_key_hash), así
+# un cambio de key se respeta de inmediato en todos los workers.
+# Los datos de perfil de _user_by_id pueden quedar desactualizados hasta
+# que expire su entrada (60 s).
+_jwt_cache: TTLCache = TTLCache(maxsize=10000, ttl=30)   # hash(token) -> (TokenData, exp)
+_user_by_id: TTLCache = TTLCache(maxsize=5000, ttl=60)    # user_id -> AuthUser
+
+# get_current_user corre en varios hilos a la vez y TTLCache no es
+# seguro entre hilos, así que todo acceso a las cachés pasa por este candado
+_cache_lock = threading.Lock()
+
+
+# Columnas que las rutas leen del usuario autenticado (ver UserResponse).
+# El resto (hashed_password, api_key_hash) no se trae en cada petición.
+_COLUMNAS_PERFIL = (User.id, User.nombre, User.email, User.api_key, User.created_at)
+
+
+class AuthUser(NamedTuple):
+    """
+    Usuario autenticado, tal como lo reciben las rutas protegidas.
+    
+    Es una tupla liviana (no un objeto de SQLAlchemy): se arma directo desde
+    la fila de la BD y se puede guardar en caché y compartir entre peticiones
+    sin depender de una sesión. Tiene los mismos campos que UserResponse.
+    """
+    id: int
+    nombre: str
+    email: str
+    api_key: str
+    created_at: datetime
+
+
+def _hash_token(token: str) -> bytes:
+    """
+    Calcula la clave de caché para un token o API Key.
+    
+    Args:
+        token: JWT o API Key tal como llegó en el header
+    
+    Retorna:
+        bytes: Primeros 16 bytes del SHA-256 del token
+    """
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+
+def _guardar_usuario_en_cache(user: AuthUser) -> None:
+    """
+    Guarda un usuario recién leído de la BD en la caché de autenticación.
+    
+    Args:
+        user: Usuario a guardar
+    """
+    with _cache_lock:
+        _user_by_id[user.id] = user
 
 
 # ============================================
@@ -52,9 +167,17 @@ def hash_password(password: str) -> str:
         password: Contraseña en texto plano (ej: "mipassword123")
     
     Retorna:
-        str: Contraseña hasheada (ej: "$2b$12$KIX...")
+        str: Contraseña hasheada (ej: "$argon2id$v=19$m=65536..." o "$2b$12$KIX...")
     """
-    return pwd_context.hash(password)
+    if PASSWORD_SCHEME == "bcrypt":
+        salt = bcrypt.gensalt(rounds=BCRYPT_COST)
+        return bcrypt.hashpw(password.encode(), salt).decode()
+    return _argon2.hash(password)
+
+
+def _es_hash_bcrypt(hashed_password: str) -> bool:
+    """Indica si un hash guardado fue generado con bcrypt ($2a$, $2b$, ...)."""
+    return hashed_password.startswith("$2")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -65,10 +188,123 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         plain_password: Contraseña en texto plano que el usuario envió
         hashed_password: Hash guardado en la base de datos
     
+    Acepta hashes argon2 y bcrypt, sin importar cuál esté configurado.
+    
     Retorna:
         bool: True si coinciden, False si no
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    if _es_hash_bcrypt(hashed_password):
+        try:
+            return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+        except ValueError:
+            # El hash guardado no tiene formato bcrypt válido
+            return False
+    
+    try:
+        return _argon2.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_necesita_rehash(hashed_password: str) -> bool:
+    """
+    Indica si un hash guardado debe regenerarse con la configuración actual.
+    
+    Pasa cuando fue hecho con otro algoritmo o con otros parámetros
+    (por ejemplo, un BCRYPT_COST distinto).
+    
+    Args:
+        hashed_password: Hash guardado en la base de datos
+    
+    Retorna:
+        bool: True si conviene volver a hashear la contraseña
+    """
+    if _es_hash_bcrypt(hashed_password):
+        if PASSWORD_SCHEME != "bcrypt":
+            return True
+        # Formato: $2b$<costo>$<salt+hash>
+        try:
+            return int(hashed_password.split("$")[2]) != BCRYPT_COST
+        except (IndexError, ValueError):
+            return True
+    
+    if PASSWORD_SCHEME != "argon2":
+        return True
+    try:
+        return _argon2.check_needs_rehash(hashed_password)
+    except InvalidHashError:
+        return True
+
+
+def _limitador_hash() -> anyio.CapacityLimiter:
+    """
+    Devuelve el limitador de hilos para el hash de contraseñas (se crea la primera vez).
+    
+    Permite dos cálculos simultáneos por núcleo de CPU.
+    """
+    global _hash_limiter
+    if _hash_limiter is None:
+        _hash_limiter = anyio.CapacityLimiter((os.cpu_count() or 1) * 2)
+    return _hash_limiter
+
+
+async def ahash_password(password: str) -> str:
+    """
+    Versión asíncrona de hash_password.
+    
+    Calcula el hash en un hilo aparte para no bloquear el event loop.
+    """
+    return await anyio.to_thread.run_sync(hash_password, password, limiter=_limitador_hash())
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Versión asíncrona de verify_password.
+    
+    Verifica la contraseña en un hilo aparte para no bloquear el event loop.
+    """
+    return await anyio.to_thread.run_sync(
+        verify_password, plain_password, hashed_password, limiter=_limitador_hash()
+    )
+
+
+def calentar_criptografia() -> None:
+    """
+    Ejecuta el hash de contraseñas y JWT una vez al iniciar el servidor.
+    
+    La primera llamada a cada librería carga código y símbolos nativos.
+    Hacerlo al arrancar evita que ese costo lo pague el primer usuario
+    que inicia sesión.
+    """
+    verify_password("warmup", hash_password("warmup"))
+    token = jwt.encode({"warmup": True}, _SECRET_KEY, algorithm=_ALGORITHM)
+    jwt.decode(token, _SECRET_KEY, algorithms=_ALGORITHMS)
+
+
+def medir_costo_bcrypt(objetivo_ms: float = 250, costo_maximo: int = 16) -> int:
+    """
+    Busca el costo de bcrypt que tarda al menos objetivo_ms en este servidor.
+    
+    Hashea una contraseña de prueba subiendo el costo de a uno hasta que
+    el tiempo alcanza el objetivo. Sirve para elegir bcrypt_cost según la
+    CPU real: en una máquina lenta el costo 12 puede tardar demasiado y en
+    una rápida quedarse corto.
+    
+    Args:
+        objetivo_ms: Tiempo deseado por hash, en milisegundos
+        costo_maximo: Costo a partir del cual se deja de medir
+    
+    Retorna:
+        int: Primer costo que alcanza el objetivo (o costo_maximo)
+    """
+    costo = 10
+    while costo < costo_maximo:
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b"test", bcrypt.gensalt(rounds=costo))
+        if (time.perf_counter() - inicio) * 1000 >= objetivo_ms:
+            break
+        costo += 1
+    return costo
 
 
 # ============================================
@@ -86,10 +322,28 @@ def generate_api_key() -> str:
         str: API Key (ej: "sk_a1b2c3d4e5f6g7h8")
     """
     # secrets.token_urlsafe genera texto aleatorio seguro
-    random_part = secrets.token_urlsafe(32)
+    # 24 bytes aleatorios (192 bits, 32 caracteres) son imposibles de adivinar
+    random_part = secrets.token_urlsafe(24)
     return f"sk_{random_part}"
 
 
+def hash_api_key(api_key: str) -> bytes:
+    """
+    Calcula el hash BLAKE2b de una API Key.
+    
+    En la base de datos buscamos por este hash (columna api_key_hash)
+    en vez de comparar la key en texto plano. 16 bytes bastan porque la
+    key ya es aleatoria, y mantienen el índice pequeño.
+    
+    Args:
+        api_key: API Key en texto plano (ej: "sk_a1b2c3...")
+    
+    Retorna:
+        bytes: Hash de 16 bytes
+    """
+    return hashlib.blake2b(api_key.encode(), digest_size=16).digest()
+
+
 # ============================================
 # FUNCIONES PARA JWT (Tokens)
 # ============================================
@@ -114,18 +368,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """
     to_encode = data.copy()
     
-    # Calcular cuándo expira el token
+    # Calcular cuándo expira el token (segundos desde 1970, como pide JWT)
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
         # Por defecto, expira en 30 días
-        expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
+        expire = int(time.time()) + _EXPIRE_SECONDS
     
     # Agregar la fecha de expiración al token
-    to_encode.update({"exp": expire})
+    to_encode["exp"] = expire
     
     # Codificar el token con nuestra clave secreta
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_KEY, algorithm=_ALGORITHM)
     return encoded_jwt
 
 
@@ -142,15 +396,28 @@ def decode_access_token(token: str) -> TokenData:
     Raises:
         HTTPException: Si el token es inválido o expiró
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    # Un JWT siempre tiene tres partes separadas por puntos.
+    # Descartar lo que no calza es casi gratis; jwt.decode (base64,
+    # firma HMAC y JSON) no lo es
+    if not token or len(token) > _MAX_TOKEN_LENGTH or token.count(".") != 2:
+        raise credentials_exception
+    
+    # Si ya decodificamos este token hace poco, reutilizar el resultado
+    clave = _hash_token(token)
+    with _cache_lock:
+        guardado = _jwt_cache.get(clave)
+    if guardado is not None:
+        token_data, exp = guardado
+        if exp is None or exp > time.time():
+            return token_data
+        # El token expiró mientras estaba en caché: sacarlo y rechazarlo
+        with _cache_lock:
+            _jwt_cache.pop(clave, None)
+        raise credentials_exception
     
     try:
         # Decodificar el token
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = jwt.decode(token, _SECRET_KEY, algorithms=_ALGORITHMS)
         
         # Extraer los datos
         user_id: int = payload.get("user_id")
@@ -159,9 +426,14 @@ def decode_access_token(token: str) -> TokenData:
         if user_id is None or email is None:
             raise credentials_exception
         
-        return TokenData(user_id=user_id, email=email)
-    
-    except JWTError:
+        # El token está firmado por nosotros: sus datos ya tienen el tipo
+        # correcto y no hace falta que Pydantic los vuelva a validar
+        token_data = TokenData.model_construct(user_id=user_id, email=email)
+        with _cache_lock:
+            _jwt_cache[clave] = (token_data, payload.get("exp"))
+        return token_data
+    
+    except InvalidTokenError:
         raise credentials_exception
 
 
@@ -169,7 +441,7 @@ def decode_access_token(token: str) -> TokenData:
 # AUTENTICACIÓN DE USUARIOS
 # ============================================
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[AuthUser]:
     """
     Autentica a un usuario verificando su email y contraseña.
     
@@ -179,37 +451,56 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
         password: Contraseña en texto plano
     
     Retorna:
-        User: Usuario si las credenciales son correctas
+        AuthUser: Usuario si las credenciales son correctas
         None: Si las credenciales son incorrectas
     """
     # Buscar usuario por email
-    user = db.query(User).filter(User.email == email).first()
+    # Todas estas columnas están en el índice ix_users_email_login,
+    # así PostgreSQL responde sin leer la tabla
+    fila = db.execute(
+        select(*_COLUMNAS_PERFIL, User.hashed_password).where(User.email == email)
+    ).first()
     
-    if not user:
+    if not fila:
         return None
     
     # Verificar contraseña
-    if not verify_password(password, user.hashed_password):
+    if not await averify_password(password, fila.hashed_password):
         return None
     
-    return user
+    # Si el hash es de un algoritmo o costo antiguo, aprovechamos que
+    # tenemos la contraseña correcta para guardarla con el actual
+    if password_necesita_rehash(fila.hashed_password):
+        nuevo_hash = await ahash_password(password)
+        db.execute(
+            update(User).where(User.id == fila.id).values(hashed_password=nuevo_hash)
+        )
+        db.commit()
+    
+    return AuthUser(*fila[:len(_COLUMNAS_PERFIL)])
 
 
 # ============================================
 # DEPENDENCIAS PARA RUTAS PROTEGIDAS
 # ============================================
 
-async def get_current_user(
-    authorization: Optional[str] = Header(None),
+# Lee el header "Authorization: Bearer ..." y además muestra el candado
+# de autenticación en la documentación (/docs).
+# auto_error=False: si falta el header, devolvemos nuestro propio error 401
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
     db: Session = Depends(get_db)
-) -> User:
+) -> AuthUser:
     """
     Obtiene el usuario actual desde el token JWT o API Key.
     
     Esta función se usa como dependencia en las rutas protegidas:
     
     @app.get("/productos")
-    def listar_productos(current_user: User = Depends(get_current_user)):
+    def listar_productos(current_user: AuthUser = Depends(get_current_user)):
         # Solo usuarios autenticados pueden acceder aquí
         ...
     
@@ -217,46 +508,60 @@ async def get_current_user(
     1. Bearer Token (JWT): Authorization: Bearer eyJhbGc...
     2. API Key: Authorization: Bearer sk_abc123...
     
+    Es una función normal (no async) a propósito: FastAPI la ejecuta en un
+    hilo aparte, así la consulta a la BD no bloquea el event loop.
+    
     Args:
-        authorization: Header Authorization de la petición
+        credentials: Esquema y token del header Authorization
         db: Sesión de base de datos
     
     Retorna:
-        User: Usuario autenticado
+        AuthUser: Usuario autenticado (id, nombre, email, api_key, created_at)
     
     Raises:
         HTTPException: Si no está autenticado o el token/key es inválido
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    if not authorization:
+    # El formato debe ser: "Bearer TOKEN_O_API_KEY"
+    if not credentials or credentials.scheme.lower() != "bearer":
         raise credentials_exception
     
-    # El formato debe ser: "Bearer TOKEN_O_API_KEY"
-    parts = authorization.split()
+    token_or_key = credentials.credentials.strip()
     
-    if len(parts) != 2 or parts[0].lower() != "bearer":
+    if not token_or_key or " " in token_or_key:
         raise credentials_exception
     
-    token_or_key = parts[1]
-    
     # Determinar si es un JWT o una API Key
     if token_or_key.startswith("sk_"):
         # Es una API Key
-        user = db.query(User).filter(User.api_key == token_or_key).first()
-        if not user:
+        # Si el largo no coincide con el de generate_api_key, no puede existir
+        if len(token_or_key) not in _API_KEY_LENGTHS:
             raise credentials_exception
-        return user
+        
+        # Sin caché: la key se valida siempre contra la BD, así un cambio de
+        # key se respeta de inmediato en todos los workers
+        fila = db.execute(
+            select(*_COLUMNAS_PERFIL).where(User.api_key_hash == hash_api_key(token_or_key))
+        ).first()
+        if not fila:
+            raise credentials_exception
+        
+        return AuthUser(*fila)
     else:
         # Es un JWT
         token_data = decode_access_token(token_or_key)
-        user = db.query(User).filter(User.id == token_data.user_id).first()
-        if not user:
+        with _cache_lock:
+            user = _user_by_id.get(token_data.user_id)
+        if user is not None:
+            return user
+        
+        fila = db.execute(
+            select(*_COLUMNAS_PERFIL).where(User.id == token_data.user_id)
+        ).first()
+        if not fila:
             raise credentials_exception
+        
+        user = AuthUser(*fila)
+        _guardar_usuario_en_cache(user)
         return user
 
 
@@ -265,13 +570,12 @@ async def get_current_user(
 # ============================================
 #
 # from fastapi import APIRouter, Depends
-# from app.auth import get_current_user
-# from app.models import User
+# from app.auth import AuthUser, get_current_user
 #
 # router = APIRouter()
 #
 # @router.get("/mi-perfil")
-# def obtener_perfil(current_user: User = Depends(get_current_user)):
+# def obtener_perfil(current_user: AuthUser = Depends(get_current_user)):
 #     """Solo usuarios autenticados pueden ver su perfil."""
 #     return {
 #         "nombre": current_user.nombre,
@@ -7,7 +7,7 @@ y las hace disponibles para el resto de la aplicación.
 Piensa en esto como el "panel de control" de tu API.
 """
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 
@@ -30,6 +30,16 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 43200  # 30 días por defecto
     
+    # Algoritmo para hashear contraseñas nuevas: "argon2" (argon2id) o "bcrypt".
+    # Los hashes guardados con otro algoritmo se rehacen al iniciar sesión
+    password_scheme: str = "argon2"
+    
+    # Costo de bcrypt para hashear contraseñas (cada +1 duplica el tiempo)
+    bcrypt_cost: int = 12
+    # Si es True, al iniciar se mide qué costo tarda ~250 ms en este servidor
+    # y se avisa si bcrypt_cost quedó por debajo
+    bcrypt_autotune: bool = False
+    
     # SendGrid - Para enviar emails
     sendgrid_api_key: str
     sendgrid_from_email: str
@@ -37,11 +47,16 @@ class Settings(BaseSettings):
     # Entorno (development o production)
     environment: str = "development"
     
-    class Config:
+    # Documentación (/docs, /redoc y /openapi.json). En producción se puede
+    # desactivar para no generar el schema OpenAPI
+    docs_enabled: bool = True
+    
+    model_config = SettingsConfigDict(
         # Le dice a Pydantic dónde buscar las variables
-        env_file = ".env"
+        env_file=".env",
         # Permite mayúsculas y minúsculas
-        case_sensitive = False
+        case_sensitive=False
+    )
 
 
 # Decorador @lru_cache hace que esto se ejecute solo una vez
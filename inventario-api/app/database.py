@@ -24,8 +24,25 @@ settings = get_settings()
 
 engine = create_engine(
     settings.database_url,
-    # pool_pre_ping verifica que la conexión esté viva antes de usarla
+    # Conexiones que se mantienen abiertas y reutilizan entre peticiones.
+    # Son por proceso: en producción hay un worker por núcleo
+    # (start_server.py), así que el máximo total es
+    # workers × (pool_size + max_overflow). Mantenerlo bajo el límite de
+    # conexiones de la base de datos (Supabase tiene un límite por plan)
+    pool_size=5,
+    # Conexiones extra que se pueden abrir en momentos de mucha carga
+    max_overflow=10,
+    # Si todas las conexiones están ocupadas, esperar hasta 30 segundos por
+    # una libre antes de fallar
+    pool_timeout=30,
+    # Verificar que la conexión siga viva antes de usarla: sobrevive a
+    # reinicios o failover de la base de datos
     pool_pre_ping=True,
+    # Además, renovar cada conexión después de 5 minutos (evita que el
+    # servidor o un proxy cierren conexiones inactivas)
+    pool_recycle=300,
+    # Reutilizar primero la conexión usada más recientemente (la más "caliente")
+    pool_use_lifo=True,
     # echo=True mostraría todas las consultas SQL en la consola (útil para debug)
     echo=False
 )
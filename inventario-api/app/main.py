@@ -16,12 +16,18 @@ La documentación estará disponible en:
 """
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
 from contextlib import asynccontextmanager
+from functools import lru_cache
+import orjson
 
 from app.config import get_settings
 from app.database import init_db
+from app.auth import BCRYPT_COST, calentar_criptografia, medir_costo_bcrypt
 from app.routes import auth, products, sales
+from app.routes.dependencias import agregar_cuerpos
 
 settings = get_settings()
 
@@ -35,7 +41,7 @@ async def lifespan(app: FastAPI):
     """
     Función que se ejecuta al iniciar y cerrar la aplicación.
     
-    Startup: Inicializa las tablas de la base de datos
+    Startup: Inicializa las tablas de la base de datos y precalienta el hash de contraseñas y JWT
     Shutdown: Limpia recursos si es necesario
     """
     # STARTUP: Se ejecuta al iniciar
@@ -45,8 +51,19 @@ async def lifespan(app: FastAPI):
     # Crear tablas en la base de datos
     init_db()
     
+    # Ejecutar el hash de contraseñas y JWT una vez para que el primer login no pague la carga
+    calentar_criptografia()
+    
+    # Medir qué costo de bcrypt corresponde a esta CPU (opcional)
+    if settings.bcrypt_autotune:
+        costo_sugerido = medir_costo_bcrypt()
+        print(f"🔐 Costo bcrypt configurado: {BCRYPT_COST} | sugerido para ~250 ms: {costo_sugerido}")
+        if BCRYPT_COST < costo_sugerido:
+            print(f"⚠️  BCRYPT_COST={BCRYPT_COST} es menor al sugerido; considera subirlo a {costo_sugerido}")
+    
     print("✅ API lista para recibir peticiones")
-    print("📖 Documentación disponible en: http://localhost:8000/docs")
+    if settings.docs_enabled:
+        print("📖 Documentación disponible en: http://localhost:8000/docs")
     
     yield  # La aplicación corre aquí
     
@@ -98,6 +115,10 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    # orjson serializa JSON (incluidas fechas) mucho más rápido que json
+    default_response_class=ORJSONResponse,
+    # Con DOCS_ENABLED=false no se expone (ni se genera) el schema OpenAPI
+    openapi_url="/openapi.json" if settings.docs_enabled else None,
     docs_url="/docs",  # Documentación interactiva (Swagger)
     redoc_url="/redoc"  # Documentación alternativa (ReDoc)
 )
@@ -135,6 +156,30 @@ app.include_router(products.router)
 app.include_router(sales.router)
 
 
+# ============================================
+# SCHEMA OPENAPI (CACHEADO)
+# ============================================
+# FastAPI guarda el schema ya generado, pero lo vuelve a convertir a JSON
+# en cada petición a /openapi.json. Aquí se reemplaza esa ruta por una que
+# genera el JSON la primera vez y después devuelve siempre los mismos bytes
+
+@lru_cache(maxsize=1)
+def _openapi_json() -> bytes:
+    """Schema OpenAPI ya serializado (se genera en la primera petición)."""
+    return orjson.dumps(agregar_cuerpos(app.openapi()))
+
+
+if app.openapi_url:
+    app.router.routes = [
+        ruta for ruta in app.router.routes
+        if isinstance(ruta, APIRoute) or getattr(ruta, "path", None) != app.openapi_url
+    ]
+    
+    @app.get(app.openapi_url, include_in_schema=False)
+    async def openapi_cacheado():
+        return Response(_openapi_json(), media_type="application/json")
+
+
 # ============================================
 # RUTA RAÍZ (HEALTH CHECK)
 # ============================================
@@ -153,7 +198,7 @@ def root():
         "mensaje": "🏪 API de Inventario para PYME",
         "version": "1.0.0",
         "status": "✅ Funcionando",
-        "documentacion": "/docs",
+        "documentacion": "/docs" if settings.docs_enabled else None,
         "entorno": settings.environment
     }
 
@@ -163,6 +208,7 @@ def root():
 # ============================================
 
 from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
@@ -174,12 +220,16 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     Maneja errores de validación de datos.
     
     Se ejecuta cuando el cliente envía datos con formato incorrecto.
+    
+    Los errores pasan por jsonable_encoder porque pueden traer valores que
+    JSON no acepta tal cual (ej: con un cuerpo JSON mal formado, el "input"
+    del error son los bytes recibidos).
     """
     return JSONResponse(
         status_code=422,
         content={
             "detail": "Error de validación",
-            "errors": exc.errors()
+            "errors": jsonable_encoder(exc.errors())
         }
     )
 
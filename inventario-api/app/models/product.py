@@ -9,7 +9,7 @@ CONCEPTOS:
 - Tiene un SKU (código único del producto)
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -33,6 +33,33 @@ class Product(Base):
     
     __tablename__ = "products"
     
+    # Índices compuestos: todas las consultas de productos filtran por usuario.
+    # - (usuario_id, sku): búsqueda por SKU; el SKU es único por usuario
+    # - (usuario_id, stock_actual, stock_minimo): filtro de stock bajo
+    # - (usuario_id, id): listado paginado por id (paginación por cursor)
+    # - ix_products_stock_bajo: índice parcial, solo con los productos bajo el
+    #   mínimo; buscar alertas pendientes recorre solo esos
+    #
+    # En una BD existente (create_all no modifica tablas ya creadas):
+    #   ALTER TABLE products DROP CONSTRAINT products_sku_key;
+    #   DROP INDEX IF EXISTS ix_products_sku;
+    #   CREATE UNIQUE INDEX ix_products_user_sku ON products (usuario_id, sku);
+    #   CREATE INDEX ix_products_user_stock
+    #       ON products (usuario_id, stock_actual, stock_minimo);
+    #   CREATE INDEX ix_products_stock_bajo
+    #       ON products (usuario_id) WHERE stock_actual <= stock_minimo;
+    #   CREATE INDEX ix_products_user_id ON products (usuario_id, id);
+    __table_args__ = (
+        Index("ix_products_user_sku", "usuario_id", "sku", unique=True),
+        Index("ix_products_user_stock", "usuario_id", "stock_actual", "stock_minimo"),
+        Index(
+            "ix_products_stock_bajo",
+            "usuario_id",
+            postgresql_where=text("stock_actual <= stock_minimo"),
+        ),
+        Index("ix_products_user_id", "usuario_id", "id"),
+    )
+    
     # ============================================
     # COLUMNAS BÁSICAS
     # ============================================
@@ -44,8 +71,9 @@ class Product(Base):
     
     # SKU: Código único del producto
     # Puede ser algo como "CAM-NIKE-001" o "PROD-12345"
-    # unique=True asegura que no haya dos productos con el mismo SKU
-    sku = Column(String(50), unique=True, nullable=False, index=True)
+    # Un usuario no puede repetir un SKU (ver ix_products_user_sku),
+    # pero dos usuarios distintos sí pueden usar el mismo
+    sku = Column(String(50), nullable=False)
     
     # Stock actual: Cuántas unidades hay ahora
     # default=0 significa que si no especificas, empieza en 0
@@ -7,7 +7,7 @@ IMPORTANTE: Cuando registras una venta, el stock del producto se descuenta autom
 Esto lo hace el servicio de ventas (sale_service.py).
 """
 
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -28,6 +28,16 @@ class Sale(Base):
     
     __tablename__ = "sales"
     
+    # Índice para listar las ventas de un producto de la más reciente a la
+    # más antigua (PostgreSQL lo recorre al revés para ORDER BY ... DESC),
+    # también con paginación por cursor (fecha, id)
+    #
+    # En una BD existente (create_all no modifica tablas ya creadas):
+    #   CREATE INDEX ix_sales_producto_fecha ON sales (producto_id, fecha, id);
+    __table_args__ = (
+        Index("ix_sales_producto_fecha", "producto_id", "fecha", "id"),
+    )
+    
     # ============================================
     # COLUMNAS
     # ============================================
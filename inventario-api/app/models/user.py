@@ -7,7 +7,7 @@ ANALOGÍA: Piensa en esto como un formulario que tiene campos específicos.
 Cada usuario tiene: id, nombre, email, password, api_key
 """
 
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -23,12 +23,24 @@ class User(Base):
         email: Correo electrónico (único, no se pueden repetir)
         hashed_password: Contraseña encriptada (nunca guardamos la contraseña real)
         api_key: Clave única para autenticación (como un "carnet digital")
+        api_key_hash: Hash BLAKE2b de la API Key (para buscarla de forma segura)
         created_at: Fecha de creación del usuario
     """
     
     # Nombre de la tabla en PostgreSQL
     __tablename__ = "users"
     
+    # Índice para el login: busca por email e incluye las columnas que
+    # el login necesita, así PostgreSQL responde solo con el índice
+    # (sin leer la fila de la tabla)
+    __table_args__ = (
+        Index(
+            "ix_users_email_login",
+            "email",
+            postgresql_include=["id", "nombre", "api_key", "created_at", "hashed_password"],
+        ),
+    )
+    
     # ============================================
     # COLUMNAS DE LA TABLA
     # ============================================
@@ -52,7 +64,15 @@ class User(Base):
     
     # API Key: Es como un "token de acceso" que el usuario usa para autenticarse
     # Se genera automáticamente cuando se crea el usuario
-    api_key = Column(String(100), unique=True, nullable=False, index=True)
+    # No lleva índice propio: las búsquedas se hacen por api_key_hash
+    api_key = Column(String(100), unique=True, nullable=False)
+    
+    # Hash BLAKE2b de 16 bytes de la API Key: las búsquedas se hacen por este
+    # valor (índice pequeño de largo fijo) en vez de la key en texto plano
+    # (ver hash_api_key en app/auth.py)
+    # Las bases de datos creadas antes de esta columna se actualizan con la
+    # migración alembic/versions/0001_api_key_hash.py (alembic upgrade head)
+    api_key_hash = Column(LargeBinary(16), unique=True, nullable=False, index=True)
     
     # Fecha de creación
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -10,18 +10,22 @@ ENDPOINTS:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from app.database import get_db
 from app.auth import (
-    hash_password, 
+    ahash_password, 
     generate_api_key, 
+    hash_api_key,
     authenticate_user,
     create_access_token,
-    get_current_user
+    get_current_user,
+    AuthUser
 )
 from app.models import User
+from app.routes.dependencias import cuerpo_json, documentar_cuerpo
 from app.schemas import UserCreate, UserLogin, UserResponse, Token
 
 # Crear el router
@@ -40,6 +44,7 @@ router = APIRouter(
     response_model=UserResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Registrar nuevo usuario",
+    openapi_extra=documentar_cuerpo(UserCreate),
     description="""
     Crea una nueva cuenta de usuario.
     
@@ -55,8 +60,8 @@ router = APIRouter(
     **Nota:** La contraseña se guarda encriptada, nunca en texto plano.
     """
 )
-def registrar_usuario(
-    user_data: UserCreate,
+async def registrar_usuario(
+    user_data: UserCreate = Depends(cuerpo_json(UserCreate)),
     db: Session = Depends(get_db)
 ):
     """
@@ -66,13 +71,19 @@ def registrar_usuario(
     - Contraseña hasheada (encriptada)
     - API Key única generada automáticamente
     """
+    # Hashear la contraseña en un hilo aparte (el hash es lento a propósito)
+    hashed_password = await ahash_password(user_data.password)
+    
+    api_key = generate_api_key()
+    
     try:
         # Crear el usuario
         nuevo_usuario = User(
             nombre=user_data.nombre,
             email=user_data.email,
-            hashed_password=hash_password(user_data.password),
-            api_key=generate_api_key()
+            hashed_password=hashed_password,
+            api_key=api_key,
+            api_key_hash=hash_api_key(api_key)
         )
         
         # Guardar en la base de datos
@@ -80,7 +91,18 @@ def registrar_usuario(
         db.commit()
         db.refresh(nuevo_usuario)
         
-        return nuevo_usuario
+        # Respuesta ya armada (mismos campos que UserResponse), sin
+        # volver a validarla con Pydantic
+        return ORJSONResponse(
+            {
+                "id": nuevo_usuario.id,
+                "nombre": nuevo_usuario.nombre,
+                "email": nuevo_usuario.email,
+                "api_key": nuevo_usuario.api_key,
+                "created_at": nuevo_usuario.created_at
+            },
+            status_code=status.HTTP_201_CREATED
+        )
     
     except IntegrityError:
         db.rollback()
@@ -124,7 +146,7 @@ def registrar_usuario(
     ```
     """
 )
-def iniciar_sesion(
+async def iniciar_sesion(
     credentials: UserLogin,
     db: Session = Depends(get_db)
 ):
@@ -134,7 +156,7 @@ def iniciar_sesion(
     Verifica las credenciales y devuelve un token JWT.
     """
     # Autenticar usuario
-    usuario = authenticate_user(db, credentials.email, credentials.password)
+    usuario = await authenticate_user(db, credentials.email, credentials.password)
     
     if not usuario:
         raise HTTPException(
@@ -151,11 +173,11 @@ def iniciar_sesion(
         }
     )
     
-    return {
+    return ORJSONResponse({
         "access_token": access_token,
         "token_type": "bearer",
-        "user": usuario
-    }
+        "user": usuario._asdict()
+    })
 
 
 # ============================================
@@ -178,14 +200,16 @@ def iniciar_sesion(
     """
 )
 def obtener_mi_perfil(
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para obtener el perfil del usuario actual.
     
     El usuario se obtiene automáticamente del token JWT o API Key.
     """
-    return current_user
+    # AuthUser ya tiene exactamente los campos de UserResponse:
+    # se devuelve tal cual, sin volver a validarlo
+    return ORJSONResponse(current_user._asdict())
 
 
 # ============================================
@@ -0,0 +1,98 @@
+"""
+DEPENDENCIAS COMPARTIDAS POR LAS RUTAS
+
+Lectura del cuerpo JSON de las peticiones de escritura (y su documentación
+en /docs).
+
+FastAPI, por defecto, convierte el cuerpo en un dict de Python (json.loads)
+y después lo valida con Pydantic. Con cuerpo_json() el cuerpo se valida
+directo desde los bytes con model_validate_json: pydantic-core parsea el
+JSON en Rust y no se arma el dict intermedio.
+"""
+
+from typing import Any, Callable, Dict, Type, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+Modelo = TypeVar("Modelo", bound=BaseModel)
+
+# Schemas de cuerpo registrados con documentar_cuerpo(), por nombre
+_CUERPOS: Dict[str, Type[BaseModel]] = {}
+
+# Clave que documentar_cuerpo() deja en la operación y que
+# agregar_cuerpos() reemplaza por el requestBody
+_MARCA_CUERPO = "x-cuerpo-json"
+
+
+def cuerpo_json(modelo: Type[Modelo]) -> Callable:
+    """
+    Crea una dependencia que valida el cuerpo de la petición con `modelo`.
+
+    Los errores se devuelven igual que los de FastAPI (422, con "body"
+    al inicio de cada loc).
+
+    Args:
+        modelo: Schema Pydantic del cuerpo (ej: SaleCreate)
+
+    Retorna:
+        Dependencia para usar con Depends()
+
+    Ejemplo:
+        venta: SaleCreate = Depends(cuerpo_json(SaleCreate))
+    """
+    async def leer_cuerpo(request: Request) -> Modelo:
+        try:
+            return modelo.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, "loc": ("body", *error["loc"])}
+                for error in e.errors(include_url=False)
+            ])
+
+    return leer_cuerpo
+
+
+def documentar_cuerpo(modelo: Type[BaseModel]) -> dict:
+    """
+    Marca la ruta para que /docs muestre el cuerpo de la petición.
+    
+    Como el cuerpo se lee con cuerpo_json(), FastAPI ya no lo ve como
+    parámetro. Aquí solo se deja una marca con el nombre del schema: el
+    JSON Schema se genera recién en agregar_cuerpos(), la primera vez que
+    se pide /openapi.json (no al importar las rutas, y nunca si la
+    documentación está desactivada).
+    
+    Args:
+        modelo: Schema Pydantic del cuerpo
+    
+    Retorna:
+        Diccionario para el parámetro openapi_extra del decorador
+    """
+    _CUERPOS[modelo.__name__] = modelo
+    return {_MARCA_CUERPO: modelo.__name__}
+
+
+def agregar_cuerpos(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reemplaza las marcas de documentar_cuerpo() por el requestBody.
+    
+    Args:
+        schema: Schema OpenAPI generado por FastAPI (se modifica aquí)
+    
+    Retorna:
+        El mismo schema, con el cuerpo de cada ruta marcada
+    """
+    for operaciones in schema.get("paths", {}).values():
+        for operacion in operaciones.values():
+            nombre = operacion.pop(_MARCA_CUERPO, None)
+            if nombre is None:
+                continue
+            
+            operacion["requestBody"] = {
+                "required": True,
+                "content": {"application/json": {"schema": _CUERPOS[nombre].model_json_schema()}}
+            }
+    
+    return schema
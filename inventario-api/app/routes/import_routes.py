@@ -9,14 +9,13 @@ ENDPOINTS:
 - POST /import/google-sheets → Importar desde Google Sheets
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.orm import Session
-import io
+from typing import Optional
 
 from app.database import get_db
-from app.auth import get_current_user
-from app.models import User
+from app.auth import AuthUser, get_current_user
 from app.services.excel_import_service import (
     importar_desde_excel,
     generar_plantilla_excel
@@ -74,13 +73,14 @@ router = APIRouter(
     """
 )
 async def importar_productos_desde_excel(
+    tareas: BackgroundTasks,
     archivo: UploadFile = File(..., description="Archivo Excel (.xlsx, .xls, .csv)"),
     actualizar: bool = Query(
         False, 
         description="Si es True, actualiza productos existentes. Si es False, rechaza duplicados."
     ),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para importar productos desde Excel.
@@ -91,10 +91,12 @@ async def importar_productos_desde_excel(
         archivo=archivo,
         db=db,
         usuario=current_user,
-        actualizar_existentes=actualizar
+        actualizar_existentes=actualizar,
+        tareas=tareas
     )
     
-    return resultado
+    # El reporte ya es un diccionario de tipos simples: se serializa directo
+    return ORJSONResponse(resultado)
 
 
 # ============================================
@@ -126,12 +128,13 @@ def descargar_plantilla_excel():
     
     Retorna un archivo Excel con formato de ejemplo.
     """
-    # Generar plantilla
+    # Generar plantilla (queda en caché después de la primera vez)
     contenido_excel = generar_plantilla_excel()
     
-    # Crear respuesta como archivo descargable
-    return StreamingResponse(
-        io.BytesIO(contenido_excel),
+    # Crear respuesta como archivo descargable.
+    # Son pocos KB ya en memoria: se envían de una vez, sin streaming
+    return Response(
+        contenido_excel,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={
             "Content-Disposition": "attachment; filename=plantilla_productos.xlsx"
@@ -181,18 +184,20 @@ def descargar_plantilla_excel():
     
     **Parámetros:**
     - spreadsheet_url: URL o ID de la Google Sheet
-    - rango: Rango de celdas (default: A1:Z1000, lee toda la hoja)
+    - hoja: Nombre de la pestaña (default: la primera). Se lee completa,
+      de a 1000 filas por vez (columnas A a Z)
     - actualizar: Si True, actualiza productos existentes
     
     **Requiere autenticación.**
     """
 )
 async def importar_productos_desde_google_sheets(
+    tareas: BackgroundTasks,
     spreadsheet_url: str = Query(..., description="URL o ID de Google Sheets"),
-    rango: str = Query("A1:Z1000", description="Rango de celdas (formato A1)"),
+    hoja: Optional[str] = Query(None, description="Nombre de la pestaña (default: la primera)"),
     actualizar: bool = Query(False, description="Actualizar productos existentes"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para importar productos desde Google Sheets.
@@ -213,11 +218,13 @@ async def importar_productos_desde_google_sheets(
         spreadsheet_id=spreadsheet_id,
         db=db,
         usuario=current_user,
-        rango=rango,
-        actualizar_existentes=actualizar
+        hoja=hoja,
+        actualizar_existentes=actualizar,
+        tareas=tareas
     )
     
-    return resultado
+    # El reporte ya es un diccionario de tipos simples: se serializa directo
+    return ORJSONResponse(resultado)
 
 
 # ============================================
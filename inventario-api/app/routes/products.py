@@ -12,13 +12,13 @@ ENDPOINTS:
 - DELETE /products/{id}   → Eliminar producto
 """
 
-from fastapi import APIRouter, Depends, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, status, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database import get_db
-from app.auth import get_current_user
-from app.models import User
+from app.auth import AuthUser, get_current_user
 from app.schemas import (
     ProductCreate, 
     ProductUpdate, 
@@ -26,6 +26,7 @@ from app.schemas import (
     ProductResponse, 
     ProductListResponse
 )
+from app.routes.dependencias import cuerpo_json, documentar_cuerpo
 from app.services import (
     crear_producto,
     listar_productos,
@@ -42,6 +43,27 @@ router = APIRouter(
 )
 
 
+def _producto_a_dict(producto) -> dict:
+    """
+    Convierte un producto de la BD al diccionario de ProductResponse.
+    
+    Las rutas devuelven este diccionario directamente (sin que FastAPI lo
+    vuelva a validar con Pydantic): los datos vienen de la BD y ya tienen
+    los tipos correctos.
+    """
+    return {
+        "id": producto.id,
+        "nombre": producto.nombre,
+        "sku": producto.sku,
+        "stock_actual": producto.stock_actual,
+        "stock_minimo": producto.stock_minimo,
+        "usuario_id": producto.usuario_id,
+        "alerta_enviada": producto.alerta_enviada,
+        "created_at": producto.created_at,
+        "updated_at": producto.updated_at
+    }
+
+
 # ============================================
 # CREAR PRODUCTO
 # ============================================
@@ -51,6 +73,7 @@ router = APIRouter(
     response_model=ProductResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Crear un nuevo producto",
+    openapi_extra=documentar_cuerpo(ProductCreate),
     description="""
     Crea un nuevo producto en el inventario.
     
@@ -64,16 +87,19 @@ router = APIRouter(
     """
 )
 def crear_nuevo_producto(
-    producto: ProductCreate,
+    producto: ProductCreate = Depends(cuerpo_json(ProductCreate)),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para crear un producto.
     
     El producto se asocia automáticamente al usuario autenticado.
     """
-    return crear_producto(db, producto, current_user)
+    return ORJSONResponse(
+        _producto_a_dict(crear_producto(db, producto, current_user)),
+        status_code=status.HTTP_201_CREATED
+    )
 
 
 # ============================================
@@ -91,9 +117,12 @@ def crear_nuevo_producto(
     - stock_bajo: Si es true, solo muestra productos con stock bajo el mínimo
     
     **Paginación:**
-    - skip: Número de productos a saltar
+    - despues_de_id: id del último producto de la página anterior (recomendado)
+    - skip: Número de productos a saltar (más lento en páginas altas)
     - limit: Máximo de productos a devolver
     
+    Los productos se devuelven ordenados por id.
+    
     **Requiere autenticación.**
     """
 )
@@ -101,20 +130,23 @@ def listar_mis_productos(
     skip: int = Query(0, ge=0, description="Productos a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Máximo de productos"),
     stock_bajo: Optional[bool] = Query(None, description="Filtrar por stock bajo"),
+    despues_de_id: Optional[int] = Query(None, description="Id del último producto de la página anterior"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para listar productos.
     
     Devuelve solo los productos del usuario autenticado.
     """
-    productos = listar_productos(db, current_user, skip, limit, stock_bajo)
+    productos, total = listar_productos(db, current_user, skip, limit, stock_bajo, despues_de_id)
     
-    return {
-        "total": len(productos),
-        "products": productos
-    }
+    # Devolver la respuesta ya armada: FastAPI no la vuelve a validar.
+    # response_model se mantiene solo para la documentación (/docs)
+    return ORJSONResponse({
+        "total": total,
+        "products": [_producto_a_dict(producto) for producto in productos]
+    })
 
 
 # ============================================
@@ -135,12 +167,12 @@ def listar_mis_productos(
 def obtener_detalle_producto(
     producto_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para obtener un producto específico.
     """
-    return obtener_producto(db, producto_id, current_user)
+    return ORJSONResponse(_producto_a_dict(obtener_producto(db, producto_id, current_user)))
 
 
 # ============================================
@@ -168,12 +200,14 @@ def actualizar_datos_producto(
     producto_id: int,
     producto: ProductUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para actualizar un producto.
     """
-    return actualizar_producto(db, producto_id, producto, current_user)
+    return ORJSONResponse(
+        _producto_a_dict(actualizar_producto(db, producto_id, producto, current_user))
+    )
 
 
 # ============================================
@@ -199,8 +233,9 @@ def actualizar_datos_producto(
 def actualizar_stock_producto(
     producto_id: int,
     stock: StockUpdate,
+    tareas: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para actualizar solo el stock.
@@ -211,7 +246,9 @@ def actualizar_stock_producto(
     Si el nuevo stock está bajo el mínimo Y no se ha enviado alerta,
     se envía un email automáticamente.
     """
-    return actualizar_stock(db, producto_id, stock, current_user)
+    return ORJSONResponse(
+        _producto_a_dict(actualizar_stock(db, producto_id, stock, current_user, tareas))
+    )
 
 
 # ============================================
@@ -234,7 +271,7 @@ def actualizar_stock_producto(
 def eliminar_producto_endpoint(
     producto_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para eliminar un producto.
@@ -10,19 +10,20 @@ ENDPOINTS:
 - GET /sales/stats  → Obtener estadísticas de ventas
 """
 
-from fastapi import APIRouter, Depends, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, status, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database import get_db
-from app.auth import get_current_user
-from app.models import User
+from app.auth import AuthUser, get_current_user
 from app.schemas import (
     SaleCreate,
-    SaleResponse,
+    SaleResponseEnriched,
     SaleConfirmation,
     SaleListResponse
 )
+from app.routes.dependencias import cuerpo_json, documentar_cuerpo
 from app.services import (
     registrar_venta,
     listar_ventas,
@@ -37,6 +38,22 @@ router = APIRouter(
 )
 
 
+def _venta_a_dict(venta) -> dict:
+    """
+    Convierte una venta de la BD al diccionario de SaleResponseEnriched,
+    agregando los datos del producto vendido.
+    """
+    return {
+        "id": venta.id,
+        "producto_id": venta.producto_id,
+        "cantidad": venta.cantidad,
+        "fecha": venta.fecha,
+        "producto_nombre": venta.product.nombre,
+        "producto_sku": venta.product.sku,
+        "stock_restante": venta.product.stock_actual
+    }
+
+
 # ============================================
 # REGISTRAR VENTA
 # ============================================
@@ -46,6 +63,7 @@ router = APIRouter(
     response_model=SaleConfirmation,
     status_code=status.HTTP_201_CREATED,
     summary="Registrar una nueva venta",
+    openapi_extra=documentar_cuerpo(SaleCreate),
     description="""
     Registra una venta y descuenta el stock automáticamente.
     
@@ -55,6 +73,7 @@ router = APIRouter(
     3. Descuenta el stock
     4. Crea el registro de venta
     5. Si el stock queda bajo el mínimo, envía alerta por email
+       (después de responder, para no demorar la respuesta)
     
     **Campos requeridos:**
     - producto_id: ID del producto a vender
@@ -64,9 +83,10 @@ router = APIRouter(
     """
 )
 def registrar_nueva_venta(
-    venta: SaleCreate,
+    tareas: BackgroundTasks,
+    venta: SaleCreate = Depends(cuerpo_json(SaleCreate)),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para registrar una venta.
@@ -74,28 +94,25 @@ def registrar_nueva_venta(
     Descuenta automáticamente el stock y envía alertas si es necesario.
     """
     # Registrar la venta (el servicio maneja toda la lógica)
-    venta_registrada, alerta_enviada = registrar_venta(db, venta, current_user)
+    venta_registrada, alerta_enviada = registrar_venta(db, venta, current_user, tareas)
     
     # Construir el mensaje de respuesta
     if alerta_enviada:
-        mensaje = f"✅ Venta registrada. ⚠️ Stock bajo mínimo. Se envió alerta por email."
+        mensaje = f"✅ Venta registrada. ⚠️ Stock bajo mínimo. Se enviará una alerta por email."
     else:
         mensaje = f"✅ Venta registrada exitosamente."
     
-    # Preparar la respuesta con información enriquecida
-    return {
-        "venta": {
-            "id": venta_registrada.id,
-            "producto_id": venta_registrada.producto_id,
-            "cantidad": venta_registrada.cantidad,
-            "fecha": venta_registrada.fecha,
-            "producto_nombre": venta_registrada.product.nombre,
-            "producto_sku": venta_registrada.product.sku,
-            "stock_restante": venta_registrada.product.stock_actual
+    # Preparar la respuesta con información enriquecida.
+    # Se devuelve ya armada para que FastAPI no la vuelva a validar
+    # contra SaleConfirmation (los datos vienen recién guardados en la BD)
+    return ORJSONResponse(
+        {
+            "venta": _venta_a_dict(venta_registrada),
+            "alerta_enviada": alerta_enviada,
+            "mensaje": mensaje
         },
-        "alerta_enviada": alerta_enviada,
-        "mensaje": mensaje
-    }
+        status_code=status.HTTP_201_CREATED
+    )
 
 
 # ============================================
@@ -113,7 +130,8 @@ def registrar_nueva_venta(
     - producto_id: Filtrar ventas de un producto específico
     
     **Paginación:**
-    - skip: Número de ventas a saltar
+    - antes_de_id: id de la última venta de la página anterior (recomendado)
+    - skip: Número de ventas a saltar (más lento en páginas altas)
     - limit: Máximo de ventas a devolver
     
     Las ventas se devuelven ordenadas por fecha (más recientes primero).
@@ -125,33 +143,26 @@ def listar_mis_ventas(
     producto_id: Optional[int] = Query(None, description="Filtrar por producto"),
     skip: int = Query(0, ge=0, description="Ventas a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Máximo de ventas"),
+    antes_de_id: Optional[int] = Query(None, description="Id de la última venta de la página anterior"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para listar ventas.
     
     Devuelve solo las ventas de productos del usuario autenticado.
     """
-    ventas = listar_ventas(db, current_user, producto_id, skip, limit)
+    ventas = listar_ventas(db, current_user, producto_id, skip, limit, antes_de_id)
     
     # Enriquecer la respuesta con información del producto
-    ventas_enriquecidas = []
-    for venta in ventas:
-        ventas_enriquecidas.append({
-            "id": venta.id,
-            "producto_id": venta.producto_id,
-            "cantidad": venta.cantidad,
-            "fecha": venta.fecha,
-            "producto_nombre": venta.product.nombre,
-            "producto_sku": venta.product.sku,
-            "stock_restante": venta.product.stock_actual
-        })
+    ventas_enriquecidas = [_venta_a_dict(venta) for venta in ventas]
     
-    return {
+    # Devolver la respuesta ya armada: FastAPI no la vuelve a validar.
+    # response_model se mantiene solo para la documentación (/docs)
+    return ORJSONResponse({
         "total": len(ventas_enriquecidas),
         "sales": ventas_enriquecidas
-    }
+    })
 
 
 # ============================================
@@ -160,7 +171,7 @@ def listar_mis_ventas(
 
 @router.get(
     "/{venta_id}",
-    response_model=SaleResponse,
+    response_model=SaleResponseEnriched,
     summary="Obtener una venta específica",
     description="""
     Obtiene los detalles de una venta por su ID.
@@ -172,22 +183,14 @@ def listar_mis_ventas(
 def obtener_detalle_venta(
     venta_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para obtener una venta específica.
     """
     venta = obtener_venta(db, venta_id, current_user)
     
-    return {
-        "id": venta.id,
-        "producto_id": venta.producto_id,
-        "cantidad": venta.cantidad,
-        "fecha": venta.fecha,
-        "producto_nombre": venta.product.nombre,
-        "producto_sku": venta.product.sku,
-        "stock_restante": venta.product.stock_actual
-    }
+    return ORJSONResponse(_venta_a_dict(venta))
 
 
 # ============================================
@@ -210,9 +213,9 @@ def obtener_detalle_venta(
 )
 def obtener_estadisticas(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Endpoint para obtener estadísticas de ventas.
     """
-    return obtener_estadisticas_ventas(db, current_user)
+    return ORJSONResponse(obtener_estadisticas_ventas(db, current_user))
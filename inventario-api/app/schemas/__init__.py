@@ -6,7 +6,7 @@ Facilita las importaciones de los schemas Pydantic.
 
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, TokenData
 from app.schemas.product import ProductCreate, ProductUpdate, StockUpdate, ProductResponse, ProductListResponse
-from app.schemas.sale import SaleCreate, SaleResponse, SaleConfirmation, SaleListResponse
+from app.schemas.sale import SaleCreate, SaleResponse, SaleResponseEnriched, SaleConfirmation, SaleListResponse
 
 __all__ = [
     # User schemas
@@ -24,6 +24,7 @@ __all__ = [
     # Sale schemas
     "SaleCreate",
     "SaleResponse",
+    "SaleResponseEnriched",
     "SaleConfirmation",
     "SaleListResponse",
 ]
@@ -0,0 +1,147 @@
+"""
+EJEMPLOS PARA LA DOCUMENTACIÓN
+
+Ejemplos de cada schema que se muestran en /docs.
+
+Se agregan recién cuando se genera el schema OpenAPI (la primera vez que se
+pide /openapi.json), no al importar los schemas. Si la documentación está
+desactivada (DOCS_ENABLED=false), nunca se arman.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict
+
+
+@lru_cache(maxsize=1)
+def _ejemplos() -> Dict[str, Dict[str, Any]]:
+    """Ejemplos por nombre de schema. Se arman una sola vez."""
+    return {
+        "UserCreate": {
+            "nombre": "Juan Pérez",
+            "email": "juan@ejemplo.cl",
+            "password": "mipassword123"
+        },
+        "UserLogin": {
+            "email": "juan@ejemplo.cl",
+            "password": "mipassword123"
+        },
+        "UserResponse": {
+            "id": 1,
+            "nombre": "Juan Pérez",
+            "email": "juan@ejemplo.cl",
+            "api_key": "sk_abc123xyz789",
+            "created_at": "2024-02-06T10:30:00"
+        },
+        "Token": {
+            "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
+            "token_type": "bearer",
+            "user": {
+                "id": 1,
+                "nombre": "Juan Pérez",
+                "email": "juan@ejemplo.cl",
+                "api_key": "sk_abc123xyz789",
+                "created_at": "2024-02-06T10:30:00"
+            }
+        },
+        "ProductCreate": {
+            "nombre": "Camiseta Nike Negra Talla M",
+            "sku": "CAM-NIKE-001",
+            "stock_actual": 50,
+            "stock_minimo": 10
+        },
+        "ProductUpdate": {
+            "stock_actual": 75,
+            "stock_minimo": 15
+        },
+        "StockUpdate": {
+            "stock_actual": 100
+        },
+        "ProductResponse": {
+            "id": 1,
+            "nombre": "Camiseta Nike Negra Talla M",
+            "sku": "CAM-NIKE-001",
+            "stock_actual": 50,
+            "stock_minimo": 10,
+            "usuario_id": 1,
+            "alerta_enviada": False,
+            "created_at": "2024-02-06T10:30:00",
+            "updated_at": "2024-02-06T10:30:00"
+        },
+        "ProductListResponse": {
+            "total": 2,
+            "products": [
+                {
+                    "id": 1,
+                    "nombre": "Camiseta Nike Negra Talla M",
+                    "sku": "CAM-NIKE-001",
+                    "stock_actual": 50,
+                    "stock_minimo": 10,
+                    "usuario_id": 1,
+                    "alerta_enviada": False,
+                    "created_at": "2024-02-06T10:30:00",
+                    "updated_at": "2024-02-06T10:30:00"
+                }
+            ]
+        },
+        "SaleCreate": {
+            "producto_id": 1,
+            "cantidad": 5
+        },
+        "SaleResponse": {
+            "id": 1,
+            "producto_id": 1,
+            "cantidad": 5,
+            "fecha": "2024-02-06T14:30:00"
+        },
+        "SaleResponseEnriched": {
+            "id": 1,
+            "producto_id": 1,
+            "cantidad": 5,
+            "fecha": "2024-02-06T14:30:00",
+            "producto_nombre": "Camiseta Nike Negra Talla M",
+            "producto_sku": "CAM-NIKE-001",
+            "stock_restante": 45
+        },
+        "SaleConfirmation": {
+            "venta": {
+                "id": 1,
+                "producto_id": 1,
+                "cantidad": 5,
+                "fecha": "2024-02-06T14:30:00",
+                "producto_nombre": "Camiseta Nike Negra Talla M",
+                "producto_sku": "CAM-NIKE-001",
+                "stock_restante": 8
+            },
+            "alerta_enviada": True,
+            "mensaje": "Venta registrada. ⚠️ Stock bajo mínimo. Se enviará una alerta por email."
+        },
+        "SaleListResponse": {
+            "total": 10,
+            "sales": [
+                {
+                    "id": 1,
+                    "producto_id": 1,
+                    "cantidad": 5,
+                    "fecha": "2024-02-06T14:30:00",
+                    "producto_nombre": "Camiseta Nike Negra Talla M",
+                    "producto_sku": "CAM-NIKE-001",
+                    "stock_restante": 45
+                }
+            ]
+        }
+    }
+
+
+def agregar_ejemplo(schema: Dict[str, Any], modelo: type) -> None:
+    """
+    Agrega el ejemplo del schema (se usa como json_schema_extra).
+    
+    Pydantic la llama solo al generar el JSON Schema del modelo.
+    
+    Args:
+        schema: JSON Schema generado por Pydantic (se modifica aquí)
+        modelo: Clase del schema
+    """
+    ejemplo = _ejemplos().get(modelo.__name__)
+    if ejemplo is not None:
+        schema["example"] = ejemplo
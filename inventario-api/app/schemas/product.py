@@ -5,10 +5,12 @@ Define qué datos se aceptan al crear/actualizar productos
 y qué datos se devuelven al cliente.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
+from app.schemas.ejemplos import agregar_ejemplo
+
 
 # ============================================
 # SCHEMA PARA CREAR PRODUCTOS
@@ -23,15 +25,9 @@ class ProductCreate(BaseModel):
     stock_actual: int = Field(default=0, ge=0, description="Stock inicial (debe ser >= 0)")
     stock_minimo: int = Field(default=10, ge=0, description="Stock mínimo antes de alerta")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "nombre": "Camiseta Nike Negra Talla M",
-                "sku": "CAM-NIKE-001",
-                "stock_actual": 50,
-                "stock_minimo": 10
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -49,13 +45,9 @@ class ProductUpdate(BaseModel):
     stock_actual: Optional[int] = Field(None, ge=0)
     stock_minimo: Optional[int] = Field(None, ge=0)
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "stock_actual": 75,
-                "stock_minimo": 15
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -70,12 +62,9 @@ class StockUpdate(BaseModel):
     """
     stock_actual: int = Field(..., ge=0, description="Nuevo valor de stock")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "stock_actual": 100
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -96,21 +85,10 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
-            "example": {
-                "id": 1,
-                "nombre": "Camiseta Nike Negra Talla M",
-                "sku": "CAM-NIKE-001",
-                "stock_actual": 50,
-                "stock_minimo": 10,
-                "usuario_id": 1,
-                "alerta_enviada": False,
-                "created_at": "2024-02-06T10:30:00",
-                "updated_at": "2024-02-06T10:30:00"
-            }
-        }
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -124,22 +102,6 @@ class ProductListResponse(BaseModel):
     total: int = Field(..., description="Número total de productos")
     products: list[ProductResponse] = Field(..., description="Lista de productos")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "total": 2,
-                "products": [
-                    {
-                        "id": 1,
-                        "nombre": "Camiseta Nike Negra Talla M",
-                        "sku": "CAM-NIKE-001",
-                        "stock_actual": 50,
-                        "stock_minimo": 10,
-                        "usuario_id": 1,
-                        "alerta_enviada": False,
-                        "created_at": "2024-02-06T10:30:00",
-                        "updated_at": "2024-02-06T10:30:00"
-                    }
-                ]
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
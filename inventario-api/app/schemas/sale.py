@@ -5,9 +5,10 @@ Define qué datos se necesitan para registrar una venta
 y qué datos se devuelven.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+
+from app.schemas.ejemplos import agregar_ejemplo
 
 
 # ============================================
@@ -23,13 +24,9 @@ class SaleCreate(BaseModel):
     producto_id: int = Field(..., gt=0, description="ID del producto a vender")
     cantidad: int = Field(..., gt=0, description="Cantidad a vender (debe ser > 0)")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "producto_id": 1,
-                "cantidad": 5
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -44,24 +41,23 @@ class SaleResponse(BaseModel):
     producto_id: int
     cantidad: int
     fecha: datetime
-    # Información adicional del producto (para comodidad)
-    producto_nombre: Optional[str] = None
-    producto_sku: Optional[str] = None
-    stock_restante: Optional[int] = None
     
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
-            "example": {
-                "id": 1,
-                "producto_id": 1,
-                "cantidad": 5,
-                "fecha": "2024-02-06T14:30:00",
-                "producto_nombre": "Camiseta Nike Negra Talla M",
-                "producto_sku": "CAM-NIKE-001",
-                "stock_restante": 45
-            }
-        }
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra=agregar_ejemplo
+    )
+
+
+class SaleResponseEnriched(SaleResponse):
+    """
+    Venta con los datos del producto vendido (para comodidad).
+    
+    Se usa cuando la consulta ya trae el producto (JOIN), así los campos
+    del producto siempre vienen y no son opcionales.
+    """
+    producto_nombre: str
+    producto_sku: str
+    stock_restante: int
 
 
 # ============================================
@@ -74,26 +70,13 @@ class SaleConfirmation(BaseModel):
     
     Incluye información de la venta Y si se envió una alerta.
     """
-    venta: SaleResponse
+    venta: SaleResponseEnriched
     alerta_enviada: bool = Field(..., description="True si se envió alerta de stock bajo")
     mensaje: str = Field(..., description="Mensaje informativo sobre la venta")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "venta": {
-                    "id": 1,
-                    "producto_id": 1,
-                    "cantidad": 5,
-                    "fecha": "2024-02-06T14:30:00",
-                    "producto_nombre": "Camiseta Nike Negra Talla M",
-                    "producto_sku": "CAM-NIKE-001",
-                    "stock_restante": 8
-                },
-                "alerta_enviada": True,
-                "mensaje": "Venta registrada. ⚠️ Stock bajo mínimo. Se envió alerta por email."
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -105,22 +88,8 @@ class SaleListResponse(BaseModel):
     Respuesta cuando se listan múltiples ventas.
     """
     total: int = Field(..., description="Número total de ventas")
-    sales: list[SaleResponse] = Field(..., description="Lista de ventas")
+    sales: list[SaleResponseEnriched] = Field(..., description="Lista de ventas")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "total": 10,
-                "sales": [
-                    {
-                        "id": 1,
-                        "producto_id": 1,
-                        "cantidad": 5,
-                        "fecha": "2024-02-06T14:30:00",
-                        "producto_nombre": "Camiseta Nike Negra Talla M",
-                        "producto_sku": "CAM-NIKE-001",
-                        "stock_restante": 45
-                    }
-                ]
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
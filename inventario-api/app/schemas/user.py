@@ -12,10 +12,12 @@ EJEMPLO:
 - La API te devuelve UserResponse (sin contraseña, con api_key)
 """
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import datetime
 from typing import Optional
 
+from app.schemas.ejemplos import agregar_ejemplo
+
 
 # ============================================
 # SCHEMA PARA CREAR USUARIOS
@@ -31,15 +33,10 @@ class UserCreate(BaseModel):
     email: EmailStr = Field(..., description="Email único del usuario")
     password: str = Field(..., min_length=6, description="Contraseña (mínimo 6 caracteres)")
     
-    class Config:
+    model_config = ConfigDict(
         # Ejemplo que aparece en la documentación automática
-        json_schema_extra = {
-            "example": {
-                "nombre": "Juan Pérez",
-                "email": "juan@ejemplo.cl",
-                "password": "mipassword123"
-            }
-        }
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -53,13 +50,9 @@ class UserLogin(BaseModel):
     email: EmailStr = Field(..., description="Email del usuario")
     password: str = Field(..., description="Contraseña del usuario")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "email": "juan@ejemplo.cl",
-                "password": "mipassword123"
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -78,18 +71,11 @@ class UserResponse(BaseModel):
     api_key: str
     created_at: datetime
     
-    class Config:
+    model_config = ConfigDict(
         # Permite que Pydantic lea datos de modelos SQLAlchemy
-        from_attributes = True
-        json_schema_extra = {
-            "example": {
-                "id": 1,
-                "nombre": "Juan Pérez",
-                "email": "juan@ejemplo.cl",
-                "api_key": "sk_abc123xyz789",
-                "created_at": "2024-02-06T10:30:00"
-            }
-        }
+        from_attributes=True,
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
@@ -107,20 +93,9 @@ class Token(BaseModel):
     token_type: str = "bearer"
     user: UserResponse
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
-                "token_type": "bearer",
-                "user": {
-                    "id": 1,
-                    "nombre": "Juan Pérez",
-                    "email": "juan@ejemplo.cl",
-                    "api_key": "sk_abc123xyz789",
-                    "created_at": "2024-02-06T10:30:00"
-                }
-            }
-        }
+    model_config = ConfigDict(
+        json_schema_extra=agregar_ejemplo
+    )
 
 
 # ============================================
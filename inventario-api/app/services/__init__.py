@@ -20,6 +20,8 @@ from app.services.sale_service import (
 
 from app.services.alert_service import (
     enviar_alerta_stock_bajo,
+    programar_alerta_stock_bajo,
+    programar_alertas_pendientes,
     probar_envio_email
 )
 
@@ -38,5 +40,7 @@ __all__ = [
     "obtener_estadisticas_ventas",
     # Alert services
     "enviar_alerta_stock_bajo",
+    "programar_alerta_stock_bajo",
+    "programar_alertas_pendientes",
     "probar_envio_email",
 ]
@@ -8,9 +8,17 @@ IMPORTANTE:
 - La bandera "alerta_enviada" evita spam de emails
 """
 
+from fastapi import BackgroundTasks
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
+from sqlalchemy import update
+from sqlalchemy.orm import Session
 from app.config import get_settings
+from app.database import SessionLocal
+from app.auth import AuthUser
+from app.models import Product
+from functools import lru_cache
+from html import escape
 import logging
 
 # Configurar logging para ver qué está pasando
@@ -19,36 +27,16 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Cliente de SendGrid: se crea una sola vez y se reutiliza en cada envío
+_sendgrid = SendGridAPIClient(settings.sendgrid_api_key)
 
-def enviar_alerta_stock_bajo(
-    email_destino: str,
-    producto_nombre: str,
-    sku: str,
-    stock_actual: int,
-    stock_minimo: int
-) -> bool:
-    """
-    Envía un email de alerta cuando un producto tiene stock bajo.
-    
-    Args:
-        email_destino: Email del usuario dueño del producto
-        producto_nombre: Nombre del producto
-        sku: SKU del producto
-        stock_actual: Stock actual
-        stock_minimo: Stock mínimo configurado
-    
-    Retorna:
-        bool: True si se envió exitosamente, False si hubo error
-    """
-    
-    # ============================================
-    # CONSTRUIR EL CONTENIDO DEL EMAIL
-    # ============================================
-    
-    asunto = f"⚠️ Alerta: Stock Bajo - {producto_nombre}"
-    
-    # Cuerpo del email en HTML (más bonito que texto plano)
-    contenido_html = f"""
+
+# ============================================
+# PLANTILLAS DEL EMAIL DE ALERTA
+# ============================================
+
+# Cuerpo del email en HTML (más bonito que texto plano)
+_PLANTILLA_HTML = """
     <html>
         <body style="font-family: Arial, sans-serif; color: #333;">
             <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
@@ -77,9 +65,9 @@ def enviar_alerta_stock_bajo(
         </body>
     </html>
     """
-    
-    # Cuerpo en texto plano (por si el cliente de email no soporta HTML)
-    contenido_texto = f"""
+
+# Cuerpo en texto plano (por si el cliente de email no soporta HTML)
+_PLANTILLA_TEXTO = """
     ⚠️ ALERTA DE STOCK BAJO
     
     Producto: {producto_nombre}
@@ -92,6 +80,67 @@ def enviar_alerta_stock_bajo(
     ---
     Este es un mensaje automático de tu sistema de inventario.
     """
+
+
+@lru_cache(maxsize=512)
+def _armar_cuerpos(
+    producto_nombre: str,
+    sku: str,
+    stock_actual: int,
+    stock_minimo: int
+) -> tuple[str, str]:
+    """
+    Rellena las plantillas del email de alerta.
+    
+    Se guarda en caché: si varias alertas del mismo producto con el mismo
+    stock salen seguidas, el contenido se arma una sola vez.
+    
+    El nombre y el SKU los escribe el usuario: en el HTML se escapan para
+    que caracteres como < o & no rompan (ni inyecten) el contenido.
+    
+    Retorna:
+        tuple: (contenido_html, contenido_texto)
+    """
+    datos = {
+        "producto_nombre": producto_nombre,
+        "sku": sku,
+        "stock_actual": stock_actual,
+        "stock_minimo": stock_minimo,
+    }
+    datos_html = {**datos, "producto_nombre": escape(producto_nombre), "sku": escape(sku)}
+    return _PLANTILLA_HTML.format_map(datos_html), _PLANTILLA_TEXTO.format_map(datos)
+
+
+def enviar_alerta_stock_bajo(
+    email_destino: str,
+    producto_nombre: str,
+    sku: str,
+    stock_actual: int,
+    stock_minimo: int
+) -> bool:
+    """
+    Envía un email de alerta cuando un producto tiene stock bajo.
+    
+    Args:
+        email_destino: Email del usuario dueño del producto
+        producto_nombre: Nombre del producto
+        sku: SKU del producto
+        stock_actual: Stock actual
+        stock_minimo: Stock mínimo configurado
+    
+    Retorna:
+        bool: True si se envió exitosamente, False si hubo error
+    """
+    
+    # ============================================
+    # CONSTRUIR EL CONTENIDO DEL EMAIL
+    # ============================================
+    
+    asunto = f"⚠️ Alerta: Stock Bajo - {producto_nombre}"
+    
+    contenido_html, contenido_texto = _armar_cuerpos(
+        producto_nombre, sku, stock_actual, stock_minimo
+    )
     
     
     # ============================================
@@ -108,11 +157,8 @@ def enviar_alerta_stock_bajo(
             plain_text_content=contenido_texto
         )
         
-        # Inicializar el cliente de SendGrid
-        sg = SendGridAPIClient(settings.sendgrid_api_key)
-        
         # Enviar el email
-        response = sg.send(message)
+        response = _sendgrid.send(message)
         
         # Verificar que se envió correctamente
         if response.status_code in [200, 201, 202]:
@@ -128,6 +174,103 @@ def enviar_alerta_stock_bajo(
         return False
 
 
+# ============================================
+# ENVÍO EN SEGUNDO PLANO
+# ============================================
+
+def programar_alerta_stock_bajo(
+    tareas: BackgroundTasks,
+    producto: Product,
+    email_destino: str
+) -> None:
+    """
+    Programa el email de alerta para después de responder la petición.
+    
+    SendGrid tarda cientos de milisegundos; así el cliente no espera el
+    envío. Quien llama debe marcar producto.alerta_enviada = True en la
+    misma transacción, para que otra petición no programe la misma alerta.
+    Si el envío falla, la bandera se vuelve a False.
+    
+    Args:
+        tareas: BackgroundTasks de la petición actual
+        producto: Producto con stock bajo
+        email_destino: Email del usuario dueño del producto
+    """
+    tareas.add_task(
+        _enviar_alerta_en_segundo_plano,
+        producto_id=producto.id,
+        email_destino=email_destino,
+        producto_nombre=producto.nombre,
+        sku=producto.sku,
+        stock_actual=producto.stock_actual,
+        stock_minimo=producto.stock_minimo
+    )
+
+
+def _enviar_alerta_en_segundo_plano(producto_id: int, **datos_alerta) -> None:
+    """
+    Envía la alerta y, si falla, libera la bandera alerta_enviada
+    para que se pueda volver a intentar en la próxima venta.
+    """
+    if enviar_alerta_stock_bajo(**datos_alerta):
+        return
+    
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Product).where(Product.id == producto_id).values(alerta_enviada=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def programar_alertas_pendientes(
+    db: Session,
+    usuario: AuthUser,
+    tareas: BackgroundTasks
+) -> int:
+    """
+    Programa las alertas de todos los productos del usuario con stock bajo
+    que aún no tienen alerta enviada.
+    
+    Se usa después de operaciones masivas (como una importación), donde
+    revisar producto por producto sería lento. Un solo UPDATE marca las
+    alertas y devuelve los productos afectados (usa el índice parcial
+    ix_products_stock_bajo).
+    
+    Args:
+        db: Sesión de base de datos
+        usuario: Dueño de los productos
+        tareas: BackgroundTasks de la petición actual
+    
+    Retorna:
+        int: Cantidad de alertas programadas
+    """
+    productos = db.execute(
+        update(Product)
+        .where(
+            Product.usuario_id == usuario.id,
+            Product.stock_actual <= Product.stock_minimo,
+            Product.alerta_enviada.is_(False)
+        )
+        .values(alerta_enviada=True)
+        .returning(
+            Product.id, Product.nombre, Product.sku,
+            Product.stock_actual, Product.stock_minimo
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    
+    for producto in productos:
+        programar_alerta_stock_bajo(tareas, producto, usuario.email)
+    
+    if productos:
+        logger.warning(f"⚠️ {len(productos)} productos con stock bajo. Alertas programadas para {usuario.email}")
+    return len(productos)
+
+
 # ============================================
 # FUNCIÓN PARA PROBAR EL ENVÍO DE EMAILS
 # ============================================
@@ -151,8 +294,7 @@ def probar_envio_email(email_destino: str) -> bool:
             plain_text_content="Este es un email de prueba. Tu sistema está configurado correctamente."
         )
         
-        sg = SendGridAPIClient(settings.sendgrid_api_key)
-        response = sg.send(message)
+        response = _sendgrid.send(message)
         
         if response.status_code in [200, 201, 202]:
             logger.info(f"✅ Email de prueba enviado a {email_destino}")
@@ -16,15 +16,22 @@ CARACTERÍSTICAS:
 - Genera reporte de resultados
 """
 
+from functools import lru_cache
+import os
+import sys
+import anyio
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Tuple
+from openpyxl import load_workbook
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from fastapi import UploadFile, HTTPException
+from fastapi import BackgroundTasks, UploadFile, HTTPException
 import io
 
-from app.models import Product, User
-from app.schemas import ProductCreate
+from app.auth import AuthUser
+from app.models import Product
+from app.services.alert_service import programar_alertas_pendientes
 
 
 class ExcelImportResult:
@@ -86,6 +93,120 @@ class ExcelImportResult:
         }
 
 
+# Limitador de hilos para importaciones (se crea la primera vez)
+_import_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _limitador_importacion() -> anyio.CapacityLimiter:
+    """
+    Devuelve el limitador de hilos para importaciones (se crea la primera vez).
+    
+    Permite una importación simultánea por núcleo de CPU: leer y validar
+    una hoja grande ocupa la CPU completa.
+    """
+    global _import_limiter
+    if _import_limiter is None:
+        _import_limiter = anyio.CapacityLimiter(os.cpu_count() or 1)
+    return _import_limiter
+
+
+async def ejecutar_importacion(funcion: Callable, *args) -> Any:
+    """
+    Ejecuta un paso de la importación en un hilo aparte.
+    
+    Leer el archivo, validarlo con pandas y guardarlo en la BD bloquea por
+    varios segundos en hojas grandes. En un hilo aparte, el event loop
+    sigue atendiendo las demás peticiones mientras tanto.
+    
+    Args:
+        funcion: Función síncrona a ejecutar
+        *args: Argumentos de la función
+    
+    Retorna:
+        Lo que retorne la función
+    """
+    return await anyio.to_thread.run_sync(funcion, *args, limiter=_limitador_importacion())
+
+
+# Mensaje de cada código de error de validación de filas (0 = sin error)
+MENSAJES_ERROR_FILA = (
+    "",
+    "Nombre vacío",
+    "SKU vacío",
+    "Stock actual no puede ser negativo",
+    "Stock mínimo no puede ser negativo",
+)
+
+
+def leer_csv(archivo) -> pd.DataFrame:
+    """
+    Lee un archivo CSV como DataFrame.
+    
+    Si pyarrow está instalado, pandas lo usa para leer el CSV (en varios
+    hilos, bastante más rápido en archivos grandes). Si no está, o si no
+    puede leer el archivo (ej: filas con distinta cantidad de columnas, que
+    el lector normal sí acepta), usa el lector normal de pandas.
+    
+    Args:
+        archivo: Archivo CSV abierto en modo binario
+    
+    Retorna:
+        DataFrame con la primera fila como nombres de columna
+    """
+    try:
+        return pd.read_csv(archivo, engine="pyarrow")
+    except (ImportError, pd.errors.ParserError, ValueError):
+        # pyarrow.lib.ArrowInvalid hereda de ValueError: así se atrapa sin
+        # tener que importar pyarrow (que es opcional)
+        archivo.seek(0)
+        return pd.read_csv(archivo)
+
+
+def leer_archivo(archivo, nombre: str) -> pd.DataFrame:
+    """
+    Lee un archivo subido (.csv, .xlsx o .xls) según su extensión.
+    
+    Args:
+        archivo: Archivo abierto en modo binario
+        nombre: Nombre del archivo (para saber el formato)
+    
+    Retorna:
+        DataFrame con la primera fila como nombres de columna
+    """
+    if nombre.endswith('.csv'):
+        return leer_csv(archivo)
+    if nombre.endswith('.xlsx'):
+        return leer_xlsx(archivo)
+    return pd.read_excel(archivo)
+
+
+def leer_xlsx(archivo) -> pd.DataFrame:
+    """
+    Lee la primera hoja de un archivo .xlsx como DataFrame.
+    
+    Usa openpyxl en modo solo lectura y pide solo los valores de las celdas:
+    las filas se leen de a una desde el archivo, sin armar un objeto por
+    celda ni cargar fórmulas y estilos (más rápido y con menos memoria que
+    pd.read_excel).
+    
+    Args:
+        archivo: Archivo .xlsx abierto en modo binario
+    
+    Retorna:
+        DataFrame con la primera fila como nombres de columna
+    """
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = next(filas, None)
+        if encabezados is None:
+            return pd.DataFrame()
+        columnas = ['' if h is None else str(h) for h in encabezados]
+        return pd.DataFrame.from_records(filas, columns=columnas)
+    finally:
+        libro.close()
+
+
 def validar_columnas_excel(df: pd.DataFrame) -> Tuple[bool, str]:
     """
     Valida que el Excel tenga las columnas necesarias.
@@ -122,10 +243,10 @@ def limpiar_datos_excel(df: pd.DataFrame) -> pd.DataFrame:
     # Eliminar filas completamente vacías
     df = df.dropna(how='all')
     
-    # Limpiar espacios en strings
+    # Limpiar espacios en strings (las celdas vacías quedan como '')
     for col in ['nombre', 'sku']:
         if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
+            df[col] = df[col].fillna('').astype(str).str.strip()
     
     # Convertir números a int (manejando valores vacíos)
     for col in ['stock_actual', 'stock_minimo']:
@@ -135,11 +256,281 @@ def limpiar_datos_excel(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def guardar_productos_importados(
+    db: Session,
+    usuario: AuthUser,
+    filas: List[Tuple[int, Dict[str, Any]]],
+    resultado: ExcelImportResult,
+    actualizar_existentes: bool = False
+) -> None:
+    """
+    Crea y actualiza en bloque los productos de una importación.
+    
+    En vez de buscar, insertar y hacer commit fila por fila, hace:
+    1. Una sola consulta para saber qué SKUs ya existen
+    2. Un INSERT masivo para los nuevos y un UPDATE masivo para los existentes
+    3. Un solo commit
+    
+    Se usa tanto para Excel como para Google Sheets.
+    
+    Args:
+        db: Sesión de base de datos
+        usuario: Usuario que importa
+        filas: Lista de (número de fila, datos) ya validados.
+            datos tiene: nombre, sku, stock_actual, stock_minimo
+        resultado: Reporte donde se registra cada fila
+        actualizar_existentes: Si True, actualiza productos existentes por SKU
+    """
+    if not filas:
+        return
+    
+    # SKUs internados: son textos cortos que se buscan varias veces en
+    # sets y diccionarios, así esas búsquedas comparan por identidad
+    for _, datos in filas:
+        datos['sku'] = sys.intern(datos['sku'])
+    
+    # SKUs del usuario que ya existen en la BD (usa ix_products_user_sku)
+    skus = {datos['sku'] for _, datos in filas}
+    existentes = dict(
+        db.query(Product.sku, Product.id).filter(
+            Product.usuario_id == usuario.id,
+            Product.sku.in_(skus)
+        )
+    )
+    
+    nuevos: Dict[str, Dict[str, Any]] = {}       # sku -> fila para INSERT
+    actualizados: Dict[str, Dict[str, Any]] = {}  # sku -> fila para UPDATE
+    pendientes: List[Tuple[int, str, str]] = []   # (fila, sku, accion)
+    vistos: set = set()                           # SKUs ya leídos en el archivo
+    
+    for fila_num, datos in filas:
+        sku = datos['sku']
+        existente = existentes.get(sku)
+        
+        # Un SKU repetido dentro del mismo archivo se detecta en una sola
+        # pasada; sin modo actualización, las filas siguientes son error
+        if sku in vistos and not actualizar_existentes:
+            resultado.agregar_error(fila_num, sku, "SKU repetido en el archivo")
+            continue
+        vistos.add(sku)
+        
+        if existente is not None and not actualizar_existentes:
+            resultado.agregar_error(
+                fila_num,
+                sku,
+                "SKU duplicado (use modo actualización para sobrescribir)"
+            )
+            continue
+        
+        valores = {
+            "nombre": datos['nombre'],
+            "stock_actual": int(datos['stock_actual']),
+            "stock_minimo": int(datos['stock_minimo']),
+        }
+        # Resetear alerta si el stock subió
+        if valores["stock_actual"] > valores["stock_minimo"]:
+            valores["alerta_enviada"] = False
+        
+        if sku in nuevos:
+            # Repetido en el archivo: la última fila gana
+            nuevos[sku].update(valores)
+            pendientes.append((fila_num, sku, "actualizado"))
+        elif existente is not None:
+            actualizados.setdefault(sku, {"id": existente}).update(valores)
+            pendientes.append((fila_num, sku, "actualizado"))
+        else:
+            nuevos[sku] = {"sku": sku, "usuario_id": usuario.id, "alerta_enviada": False, **valores}
+            pendientes.append((fila_num, sku, "creado"))
+    
+    fallidos: set = set()  # SKUs que no se pudieron insertar
+    
+    try:
+        if nuevos:
+            db.bulk_insert_mappings(Product, list(nuevos.values()))
+        if actualizados:
+            db.bulk_update_mappings(Product, list(actualizados.values()))
+        db.commit()
+    
+    except IntegrityError:
+        # Otro proceso creó alguno de estos SKUs entre la consulta y el INSERT.
+        # Reintentar insertando de a uno (cada uno en su SAVEPOINT), así solo
+        # fallan los SKUs en conflicto y no toda la importación
+        db.rollback()
+        fallidos = _insertar_de_a_uno(db, list(nuevos.values()))
+        if actualizados:
+            db.bulk_update_mappings(Product, list(actualizados.values()))
+        db.commit()
+    
+    for fila_num, sku, accion in pendientes:
+        if sku in fallidos:
+            resultado.agregar_error(fila_num, sku, "Error de base de datos (posible SKU duplicado)")
+        elif accion == "creado":
+            resultado.agregar_exito(fila_num, sku, accion)
+        else:
+            stock = (actualizados.get(sku) or nuevos[sku])["stock_actual"]
+            resultado.agregar_exito(fila_num, sku, accion, f"Stock actualizado: {stock}")
+
+
+def _insertar_de_a_uno(db: Session, filas: List[Dict[str, Any]]) -> set:
+    """
+    Inserta productos uno por uno, cada uno dentro de un SAVEPOINT.
+    
+    Es el plan B de guardar_productos_importados cuando el INSERT masivo
+    choca con un SKU repetido: un error solo deshace su propio SAVEPOINT.
+    
+    Args:
+        db: Sesión de base de datos
+        filas: Productos a insertar (como diccionarios de columnas)
+    
+    Retorna:
+        set: SKUs que no se pudieron insertar
+    """
+    fallidos = set()
+    for fila in filas:
+        try:
+            with db.begin_nested():
+                db.bulk_insert_mappings(Product, [fila])
+        except IntegrityError:
+            fallidos.add(fila["sku"])
+    return fallidos
+
+
+def importar_dataframe(
+    df: pd.DataFrame,
+    db: Session,
+    usuario: AuthUser,
+    actualizar_existentes: bool = False,
+    tareas: Optional[BackgroundTasks] = None
+) -> Dict[str, Any]:
+    """
+    Valida y guarda los productos de una hoja ya cargada en un DataFrame.
+    
+    Es el proceso común de Excel/CSV y Google Sheets: el índice del
+    DataFrame debe ser la posición de la fila de datos (0 = primera fila
+    después del encabezado), para poder informar el número de fila.
+    
+    Args:
+        df: Datos leídos de la hoja (las columnas son los encabezados)
+        db: Sesión de base de datos
+        usuario: Usuario que importa
+        actualizar_existentes: Si True, actualiza productos existentes por SKU
+        tareas: Si se entrega, se programan las alertas de stock bajo
+    
+    Retorna:
+        Dict con resultados de la importación
+    
+    Raises:
+        HTTPException: Si faltan columnas requeridas
+    """
+    resultado = ExcelImportResult()
+    procesar_dataframe(df, db, usuario, resultado, actualizar_existentes)
+    return finalizar_importacion(db, usuario, resultado, tareas)
+
+
+def procesar_dataframe(
+    df: pd.DataFrame,
+    db: Session,
+    usuario: AuthUser,
+    resultado: ExcelImportResult,
+    actualizar_existentes: bool = False
+) -> None:
+    """
+    Valida y guarda un bloque de filas, sumándolas al reporte `resultado`.
+    
+    Permite importar una hoja grande por partes (ej: Google Sheets página
+    por página) acumulando todo en un solo reporte.
+    
+    Args:
+        df: Filas del bloque (las columnas son los encabezados)
+        db: Sesión de base de datos
+        usuario: Usuario que importa
+        resultado: Reporte donde se acumulan las filas
+        actualizar_existentes: Si True, actualiza productos existentes por SKU
+    
+    Raises:
+        HTTPException: Si faltan columnas requeridas
+    """
+    # Validar columnas
+    es_valido, mensaje_error = validar_columnas_excel(df)
+    if not es_valido:
+        raise HTTPException(
+            status_code=400,
+            detail=mensaje_error
+        )
+    
+    # Limpiar datos
+    df = limpiar_datos_excel(df)
+    
+    resultado.total += len(df)
+    
+    # Validar todas las filas de una vez con pandas (sin recorrerlas en Python).
+    # Cada fila recibe el primer error que encuentre, en este orden
+    fila_nums = df.index.to_numpy() + 2  # +2 porque la hoja empieza en 1 y tiene header
+    # Se trabaja con arreglos NumPy y un código de error por fila
+    # (0 = sin error), más liviano que un arreglo de textos
+    codigos = np.select(
+        [
+            df['nombre'].to_numpy() == '',
+            df['sku'].to_numpy() == '',
+            df['stock_actual'].to_numpy() < 0,
+            df['stock_minimo'].to_numpy() < 0,
+        ],
+        [1, 2, 3, 4],
+        default=0
+    ).astype(np.int8)
+    invalidas = codigos != 0
+    
+    # Solo las filas con error se recorren, para agregarlas al reporte
+    for fila_num, sku, codigo in zip(
+        fila_nums[invalidas].tolist(),
+        df['sku'].to_numpy()[invalidas].tolist(),
+        codigos[invalidas].tolist()
+    ):
+        resultado.agregar_error(fila_num, sku or 'N/A', MENSAJES_ERROR_FILA[codigo])
+    
+    # Las válidas se guardan todas juntas al final
+    registros = df.loc[~invalidas, ['nombre', 'sku', 'stock_actual', 'stock_minimo']].to_dict('records')
+    filas_validas = list(zip(fila_nums[~invalidas].tolist(), registros))
+    
+    # Crear/actualizar todos los productos válidos en bloque
+    guardar_productos_importados(db, usuario, filas_validas, resultado, actualizar_existentes)
+
+
+def finalizar_importacion(
+    db: Session,
+    usuario: AuthUser,
+    resultado: ExcelImportResult,
+    tareas: Optional[BackgroundTasks] = None
+) -> Dict[str, Any]:
+    """
+    Cierra una importación: programa las alertas y arma el reporte final.
+    
+    Args:
+        db: Sesión de base de datos
+        usuario: Usuario que importa
+        resultado: Reporte con todas las filas procesadas
+        tareas: Si se entrega, se programan las alertas de stock bajo
+    
+    Retorna:
+        Dict con resultados de la importación
+    """
+    # Alertas de stock bajo para lo importado: una sola consulta al final
+    # en vez de revisar cada fila
+    if tareas is not None:
+        programar_alertas_pendientes(db, usuario, tareas)
+    
+    # Mantener el detalle ordenado por número de fila
+    resultado.detalles.sort(key=lambda detalle: detalle["fila"])
+    
+    return resultado.to_dict()
+
+
 async def importar_desde_excel(
     archivo: UploadFile,
     db: Session,
-    usuario: User,
-    actualizar_existentes: bool = False
+    usuario: AuthUser,
+    actualizar_existentes: bool = False,
+    tareas: Optional[BackgroundTasks] = None
 ) -> Dict[str, Any]:
     """
     Importa productos desde un archivo Excel.
@@ -149,6 +540,7 @@ async def importar_desde_excel(
         db: Sesión de base de datos
         usuario: Usuario que importa
         actualizar_existentes: Si True, actualiza productos existentes por SKU
+        tareas: Si se entrega, se programan las alertas de stock bajo
     
     Retorna:
         Dict con resultados de la importación
@@ -164,13 +556,12 @@ async def importar_desde_excel(
         )
     
     # Leer archivo
+    # FastAPI ya guardó el archivo subido en un archivo temporal (en disco si
+    # es grande). pandas lo lee directo desde ahí, sin copiar todo el
+    # contenido a memoria con archivo.read()
     try:
-        contenido = await archivo.read()
-        
-        if archivo.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contenido))
-        else:
-            df = pd.read_excel(io.BytesIO(contenido))
+        await archivo.seek(0)
+        df = await ejecutar_importacion(leer_archivo, archivo.file, archivo.filename)
     
     except Exception as e:
         raise HTTPException(
@@ -178,111 +569,19 @@ async def importar_desde_excel(
             detail=f"Error al leer archivo: {str(e)}"
         )
     
-    # Validar columnas
-    es_valido, mensaje_error = validar_columnas_excel(df)
-    if not es_valido:
-        raise HTTPException(
-            status_code=400,
-            detail=mensaje_error
-        )
-    
-    # Limpiar datos
-    df = limpiar_datos_excel(df)
-    
-    # Inicializar resultado
-    resultado = ExcelImportResult()
-    resultado.total = len(df)
-    
-    # Procesar cada fila
-    for index, fila in df.iterrows():
-        fila_num = index + 2  # +2 porque Excel empieza en 1 y tiene header
-        
-        try:
-            # Validar datos de la fila
-            if pd.isna(fila['nombre']) or fila['nombre'] == '':
-                resultado.agregar_error(fila_num, fila.get('sku', 'N/A'), "Nombre vacío")
-                continue
-            
-            if pd.isna(fila['sku']) or fila['sku'] == '':
-                resultado.agregar_error(fila_num, 'N/A', "SKU vacío")
-                continue
-            
-            if fila['stock_actual'] < 0:
-                resultado.agregar_error(fila_num, fila['sku'], "Stock actual no puede ser negativo")
-                continue
-            
-            if fila['stock_minimo'] < 0:
-                resultado.agregar_error(fila_num, fila['sku'], "Stock mínimo no puede ser negativo")
-                continue
-            
-            # Verificar si el producto ya existe
-            producto_existente = db.query(Product).filter(
-                Product.sku == fila['sku'],
-                Product.usuario_id == usuario.id
-            ).first()
-            
-            if producto_existente:
-                if actualizar_existentes:
-                    # Actualizar producto existente
-                    producto_existente.nombre = fila['nombre']
-                    producto_existente.stock_actual = int(fila['stock_actual'])
-                    producto_existente.stock_minimo = int(fila['stock_minimo'])
-                    
-                    # Resetear alerta si el stock subió
-                    if producto_existente.stock_actual > producto_existente.stock_minimo:
-                        producto_existente.alerta_enviada = False
-                    
-                    db.commit()
-                    resultado.agregar_exito(
-                        fila_num, 
-                        fila['sku'], 
-                        "actualizado",
-                        f"Stock actualizado: {producto_existente.stock_actual}"
-                    )
-                else:
-                    resultado.agregar_error(
-                        fila_num, 
-                        fila['sku'], 
-                        "SKU duplicado (use modo actualización para sobrescribir)"
-                    )
-            else:
-                # Crear nuevo producto
-                nuevo_producto = Product(
-                    nombre=fila['nombre'],
-                    sku=fila['sku'],
-                    stock_actual=int(fila['stock_actual']),
-                    stock_minimo=int(fila['stock_minimo']),
-                    usuario_id=usuario.id
-                )
-                
-                db.add(nuevo_producto)
-                db.commit()
-                
-                resultado.agregar_exito(fila_num, fila['sku'], "creado")
-        
-        except IntegrityError as e:
-            db.rollback()
-            resultado.agregar_error(
-                fila_num, 
-                fila.get('sku', 'N/A'), 
-                "Error de base de datos (posible SKU duplicado)"
-            )
-        
-        except Exception as e:
-            db.rollback()
-            resultado.agregar_error(
-                fila_num, 
-                fila.get('sku', 'N/A'), 
-                f"Error inesperado: {str(e)}"
-            )
-    
-    return resultado.to_dict()
+    return await ejecutar_importacion(
+        importar_dataframe, df, db, usuario, actualizar_existentes, tareas
+    )
 
 
+@lru_cache(maxsize=1)
 def generar_plantilla_excel() -> bytes:
     """
     Genera un archivo Excel de plantilla con ejemplos.
     
+    El contenido nunca cambia: se genera la primera vez y después se
+    devuelven los mismos bytes desde la caché.
+    
     Retorna:
         bytes: Contenido del archivo Excel
     """
@@ -312,19 +611,11 @@ def generar_plantilla_excel() -> bytes:
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         df.to_excel(writer, index=False, sheet_name='Productos')
         
-        # Ajustar ancho de columnas
+        # Ajustar ancho de columnas (los datos son fijos, así que los anchos
+        # también: texto más largo de cada columna + 2)
         worksheet = writer.sheets['Productos']
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
+        for letra, ancho in zip("ABCD", (17, 14, 14, 14)):
+            worksheet.column_dimensions[letra].width = ancho
     
     output.seek(0)
     return output.getvalue()
@@ -341,7 +632,7 @@ def generar_plantilla_excel() -> bytes:
 #     archivo: UploadFile,
 #     actualizar: bool = False,
 #     db: Session = Depends(get_db),
-#     user: User = Depends(get_current_user)
+#     user: AuthUser = Depends(get_current_user)
 # ):
 #     resultado = await importar_desde_excel(archivo, db, user, actualizar)
 #     return resultado
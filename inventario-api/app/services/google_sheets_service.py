@@ -20,14 +20,27 @@ from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import pickle
+from googleapiclient.http import HttpRequest
+import google_auth_httplib2
+import httplib2
+import numpy as np
+import pandas as pd
 import os
-from typing import List, Dict, Any, Optional
+import re
+import tempfile
+import threading
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from fastapi import HTTPException
+from fastapi import BackgroundTasks, HTTPException
 
-from app.models import Product, User
-from app.services.excel_import_service import ExcelImportResult
+from app.auth import AuthUser
+from app.services.excel_import_service import (
+    ExcelImportResult,
+    ejecutar_importacion,
+    finalizar_importacion,
+    procesar_dataframe,
+    validar_columnas_excel
+)
 
 
 # ============================================
@@ -35,9 +48,89 @@ from app.services.excel_import_service import ExcelImportResult
 # ============================================
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
-TOKEN_FILE = 'token.pickle'
+TOKEN_FILE = 'token.json'
 CREDENTIALS_FILE = 'credentials.json'
 
+# Patrón para extraer el ID de una URL de Google Sheets
+# (se compila una sola vez al cargar el módulo)
+_SHEET_ID_RE = re.compile(r'/spreadsheets/d/([a-zA-Z0-9_-]+)')
+
+# Filas de datos que se piden a la API por cada página al importar
+FILAS_POR_PAGINA = 1000
+
+# Máximo de filas que puede tener una hoja para importarla. Se revisa con
+# los metadatos de la hoja antes de leer datos
+MAX_FILAS_IMPORTACION = 100_000
+
+# Columnas que se importan (en la hoja pueden estar en cualquier orden)
+COLUMNAS_REQUERIDAS = ['nombre', 'sku', 'stock_actual', 'stock_minimo']
+
+# Cliente de la API de Sheets: se crea una vez y se reutiliza.
+# Las credenciales se refrescan solas cuando expiran
+_sheets_service = None
+_sheets_creds: Optional[Credentials] = None
+_sheets_lock = threading.Lock()
+
+# Último access token guardado en TOKEN_FILE (para no reescribirlo si no cambió)
+_token_guardado: Optional[str] = None
+
+# Credenciales leídas de TOKEN_FILE, junto a la fecha de modificación del
+# archivo (st_mtime_ns): mientras el archivo no cambie, no se vuelve a leer
+_creds_cache: Optional[Tuple[int, Credentials]] = None
+
+
+def _obtener_servicio_sheets():
+    """
+    Devuelve el cliente de Google Sheets (se crea la primera vez).
+    
+    Crear el cliente lee las credenciales y descarga la descripción
+    de la API, así que no conviene repetirlo en cada importación.
+    
+    Las importaciones corren en hilos aparte y httplib2 no es seguro
+    entre hilos: el cliente se comparte, pero cada petición usa su
+    propia conexión HTTP con las mismas credenciales.
+    """
+    global _sheets_service, _sheets_creds
+    if _sheets_service is None:
+        with _sheets_lock:
+            if _sheets_service is None:
+                creds = obtener_credenciales_google()
+                
+                def nueva_peticion(http, *args, **kwargs):
+                    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+                    return HttpRequest(http, *args, **kwargs)
+                
+                _sheets_service = build(
+                    'sheets', 'v4',
+                    http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()),
+                    requestBuilder=nueva_peticion,
+                    cache_discovery=False
+                )
+                _sheets_creds = creds
+    return _sheets_service
+
+
+def _guardar_credenciales(creds: Credentials) -> None:
+    """
+    Guarda las credenciales en TOKEN_FILE (JSON) si el token cambió.
+    
+    El cliente refresca el token solo (en memoria) cuando expira; así el
+    token nuevo se guarda una vez, sin reescribir el archivo en cada
+    importación.
+    
+    Se escribe primero un archivo temporal y después se reemplaza el
+    original (os.replace es atómico): nunca queda un token a medio escribir.
+    """
+    global _token_guardado, _creds_cache
+    if creds is None or creds.token == _token_guardado:
+        return
+    directorio = os.path.dirname(os.path.abspath(TOKEN_FILE))
+    with tempfile.NamedTemporaryFile('w', dir=directorio, suffix='.tmp', delete=False) as temporal:
+        temporal.write(creds.to_json())
+    os.replace(temporal.name, TOKEN_FILE)
+    _token_guardado = creds.token
+    _creds_cache = (os.stat(TOKEN_FILE).st_mtime_ns, creds)
+
 
 def obtener_credenciales_google() -> Optional[Credentials]:
     """
@@ -49,12 +142,18 @@ def obtener_credenciales_google() -> Optional[Credentials]:
     Retorna:
         Credentials o None si no se pudo autenticar
     """
+    global _token_guardado, _creds_cache
     creds = None
     
-    # Verificar si hay un token guardado
+    # Verificar si hay un token guardado (se relee solo si el archivo cambió)
     if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'rb') as token:
-            creds = pickle.load(token)
+        modificado = os.stat(TOKEN_FILE).st_mtime_ns
+        if _creds_cache is not None and _creds_cache[0] == modificado:
+            creds = _creds_cache[1]
+        else:
+            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+            _creds_cache = (modificado, creds)
+        _token_guardado = creds.token
     
     # Si no hay credenciales válidas, iniciar flujo de autenticación
     if not creds or not creds.valid:
@@ -82,44 +181,55 @@ def obtener_credenciales_google() -> Optional[Credentials]:
             creds = flow.credentials
         
         # Guardar credenciales
-        with open(TOKEN_FILE, 'wb') as token:
-            pickle.dump(creds, token)
+        _guardar_credenciales(creds)
     
     return creds
 
 
 def leer_google_sheet(
     spreadsheet_id: str,
-    rango: str = "A1:Z1000"
-) -> List[List[Any]]:
+    rangos: List[str],
+    permitir_vacio: bool = False
+) -> List[List[List[Any]]]:
     """
-    Lee datos de una Google Sheet.
+    Lee uno o más rangos de una Google Sheet en una sola llamada a la API.
+    
+    Usa values.batchGet: varios rangos (por ejemplo, varias pestañas)
+    se leen en una sola petición HTTP, y la máscara `fields` hace que
+    Google devuelva solo los valores, sin metadatos.
     
     Args:
         spreadsheet_id: ID de la hoja (está en la URL)
             Ej: docs.google.com/spreadsheets/d/[SPREADSHEET_ID]/edit
-        rango: Rango de celdas a leer (formato A1)
+        rangos: Rangos de celdas a leer (formato A1, ej: ["Hoja1!A1:D500"])
+        permitir_vacio: Si es False, que no haya datos es un error 404
     
     Retorna:
-        Lista de listas con los valores
+        Una lista de filas por cada rango, en el mismo orden de `rangos`
     
     Raises:
         HTTPException: Si no se puede leer la hoja
     """
     try:
-        creds = obtener_credenciales_google()
-        service = build('sheets', 'v4', credentials=creds)
+        service = _obtener_servicio_sheets()
         
-        # Leer hoja
-        sheet = service.spreadsheets()
-        result = sheet.values().get(
+        # Leer todos los rangos de una vez. UNFORMATTED_VALUE devuelve los
+        # números como números (sin el formato de la celda)
+        result = service.spreadsheets().values().batchGet(
             spreadsheetId=spreadsheet_id,
-            range=rango
+            ranges=rangos,
+            majorDimension='ROWS',
+            valueRenderOption='UNFORMATTED_VALUE',
+            fields='valueRanges(values)'
         ).execute()
         
-        valores = result.get('values', [])
+        # Si el cliente refrescó el token durante la llamada, guardarlo
+        _guardar_credenciales(_sheets_creds)
+        
+        # Un rango sin datos viene sin la clave 'values'
+        valores = [rango.get('values', []) for rango in result.get('valueRanges', [])]
         
-        if not valores:
+        if not permitir_vacio and not any(valores):
             raise HTTPException(
                 status_code=404,
                 detail="La hoja está vacía o no se pudo leer"
@@ -127,6 +237,8 @@ def leer_google_sheet(
         
         return valores
     
+    except HTTPException:
+        raise
     except HttpError as e:
         raise HTTPException(
             status_code=400,
@@ -139,184 +251,200 @@ def leer_google_sheet(
         )
 
 
-def validar_columnas_sheet(valores: List[List[Any]]) -> tuple[bool, str]:
+def contar_filas_sheet(spreadsheet_id: str, hoja: Optional[str] = None) -> int:
     """
-    Valida que la sheet tenga las columnas necesarias.
+    Devuelve cuántas filas tiene una pestaña, sin leer sus datos.
+    
+    Pide solo los metadatos de la hoja (máscara `fields`), así es una
+    respuesta de pocos bytes aunque la hoja sea enorme.
     
     Args:
-        valores: Datos de la sheet
+        spreadsheet_id: ID de la Google Sheet
+        hoja: Nombre de la pestaña (default: la primera)
     
     Retorna:
-        Tuple[bool, str]: (es_valido, mensaje_error)
-    """
-    if len(valores) < 1:
-        return False, "La hoja está vacía"
-    
-    # Primera fila = headers
-    headers = [str(h).lower().strip() for h in valores[0]]
+        int: Cantidad de filas de la pestaña (incluye las vacías)
     
-    columnas_requeridas = ['nombre', 'sku', 'stock_actual', 'stock_minimo']
+    Raises:
+        HTTPException: Si no se puede leer la hoja o la pestaña no existe
+    """
+    try:
+        service = _obtener_servicio_sheets()
+        
+        result = service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets(properties(title,gridProperties(rowCount)))'
+        ).execute()
+        
+        pestanas = [pestana['properties'] for pestana in result.get('sheets', [])]
+        if hoja is not None:
+            pestanas = [pestana for pestana in pestanas if pestana.get('title') == hoja]
+        
+        if not pestanas:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No se encontró la pestaña '{hoja}'" if hoja else "La hoja no tiene pestañas"
+            )
+        
+        return pestanas[0].get('gridProperties', {}).get('rowCount', 0)
     
-    for columna in columnas_requeridas:
-        if columna not in headers:
-            return False, f"Falta la columna requerida: '{columna}'"
+    except HTTPException:
+        raise
+    except HttpError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error de Google Sheets API: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al leer Google Sheet: {str(e)}"
+        )
+
+
+def _rango_filas(hoja: Optional[str], desde: int, hasta: int) -> str:
+    """
+    Arma el rango A1 de las filas `desde`..`hasta` (columnas A a Z).
     
-    return True, ""
+    Sin `hoja` el rango se refiere a la primera pestaña.
+    """
+    prefijo = "'" + hoja.replace("'", "''") + "'!" if hoja else ""
+    return f"{prefijo}A{desde}:Z{hasta}"
 
 
-def parsear_fila_sheet(
-    fila: List[Any],
-    headers: List[str]
-) -> Optional[Dict[str, Any]]:
+def iterar_paginas_sheet(
+    spreadsheet_id: str,
+    hoja: Optional[str] = None,
+    filas_por_pagina: int = FILAS_POR_PAGINA,
+    ultima_fila: Optional[int] = None
+) -> Iterator[Tuple[int, List[List[Any]]]]:
     """
-    Convierte una fila de Google Sheet a diccionario.
+    Recorre las filas de datos de una hoja de a una página por vez.
+    
+    Pide A2:Z1001, A1002:Z2001, etc. hasta `ultima_fila`. Las páginas
+    vacías se saltan (un bloque de filas en blanco en medio de la hoja no
+    corta la importación). Si no se conoce `ultima_fila`, se detiene en la
+    primera página vacía. En memoria solo queda una página a la vez.
     
     Args:
-        fila: Lista de valores de la fila
-        headers: Lista de nombres de columnas
+        spreadsheet_id: ID de la Google Sheet
+        hoja: Nombre de la pestaña (default: la primera)
+        filas_por_pagina: Filas que se piden en cada llamada a la API
+        ultima_fila: Última fila de la hoja (ver contar_filas_sheet)
     
     Retorna:
-        Dict con los datos o None si la fila está vacía
+        Iterador de (número de la primera fila de la página, filas)
     """
-    # Si la fila está vacía, ignorar
-    if not fila or all(v == '' for v in fila):
-        return None
+    inicio = 2  # La fila 1 son los encabezados
+    while ultima_fila is None or inicio <= ultima_fila:
+        fin = inicio + filas_por_pagina - 1
+        if ultima_fila is not None:
+            fin = min(fin, ultima_fila)
+        rango = _rango_filas(hoja, inicio, fin)
+        filas = leer_google_sheet(spreadsheet_id, [rango], permitir_vacio=True)[0]
+        if filas:
+            yield inicio, filas
+        elif ultima_fila is None:
+            return
+        inicio += filas_por_pagina
+
+
+def _importar_por_paginas(
+    spreadsheet_id: str,
+    db: Session,
+    usuario: AuthUser,
+    hoja: Optional[str],
+    actualizar_existentes: bool,
+    tareas: Optional[BackgroundTasks]
+) -> Dict[str, Any]:
+    """
+    Importa la hoja página por página (se ejecuta en un hilo aparte).
+    
+    Cada página se valida y se guarda antes de pedir la siguiente;
+    todas se acumulan en un solo reporte.
+    
+    Raises:
+        HTTPException: 413 si la hoja tiene más de MAX_FILAS_IMPORTACION filas
+    """
+    # Revisar el tamaño antes de leer datos: una hoja gigante se rechaza
+    # de inmediato en vez de demorar minutos leyéndola
+    total_filas = contar_filas_sheet(spreadsheet_id, hoja)
+    if total_filas > MAX_FILAS_IMPORTACION + 1:  # +1 por los encabezados
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                f"La hoja tiene {total_filas} filas; el máximo para importar es "
+                f"{MAX_FILAS_IMPORTACION}. Divídela en varias pestañas."
+            )
+        )
+    
+    # Encabezados (fila 1): se leen una vez y se usan en todas las páginas
+    encabezados = [str(h) for h in leer_google_sheet(spreadsheet_id, [_rango_filas(hoja, 1, 1)])[0][0]]
+    
+    es_valido, mensaje_error = validar_columnas_excel(pd.DataFrame(columns=encabezados))
+    if not es_valido:
+        raise HTTPException(status_code=400, detail=mensaje_error)
     
-    # Crear diccionario con valores por defecto
-    datos = {}
+    # Posición de cada columna requerida: se calcula una sola vez y de cada
+    # fila se toman solo esas celdas (el resto de las columnas se ignora)
+    indice_columna = {h.lower().strip(): i for i, h in enumerate(encabezados)}
+    posiciones = [indice_columna[columna] for columna in COLUMNAS_REQUERIDAS]
     
-    for i, header in enumerate(headers):
-        valor = fila[i] if i < len(fila) else ''
+    resultado = ExcelImportResult()
+    
+    for inicio, filas in iterar_paginas_sheet(spreadsheet_id, hoja, ultima_fila=total_filas):
+        # La API omite las celdas vacías al final de cada fila: las que
+        # faltan quedan como ''. Todas las celdas se pasan a texto: con
+        # UNFORMATTED_VALUE un SKU numérico llega como int y, mezclado con
+        # celdas vacías, pandas convertiría la columna a float ("1001.0")
+        filas = [
+            [str(fila[i]) if i < len(fila) else '' for i in posiciones]
+            for fila in filas
+        ]
+        # El índice es la posición de la fila de datos en la hoja, para que
+        # el reporte muestre el número de fila real.
+        # Celdas vacías como nulos, así las filas en blanco se descartan al limpiar
+        df = pd.DataFrame(
+            filas,
+            columns=COLUMNAS_REQUERIDAS,
+            index=range(inicio - 2, inicio - 2 + len(filas)),
+            dtype=object
+        ).replace('', np.nan)
         
-        # Limpiar y convertir
-        if header in ['nombre', 'sku']:
-            datos[header] = str(valor).strip()
-        elif header in ['stock_actual', 'stock_minimo']:
-            try:
-                datos[header] = int(valor) if valor != '' else 0
-            except ValueError:
-                datos[header] = 0
+        # Mismo proceso que Excel: validación vectorizada y guardado en bloque
+        procesar_dataframe(df, db, usuario, resultado, actualizar_existentes)
     
-    return datos
+    return finalizar_importacion(db, usuario, resultado, tareas)
 
 
 async def importar_desde_google_sheet(
     spreadsheet_id: str,
     db: Session,
-    usuario: User,
-    rango: str = "A1:Z1000",
-    actualizar_existentes: bool = False
+    usuario: AuthUser,
+    hoja: Optional[str] = None,
+    actualizar_existentes: bool = False,
+    tareas: Optional[BackgroundTasks] = None
 ) -> Dict[str, Any]:
     """
     Importa productos desde Google Sheets.
     
+    La hoja se lee de a FILAS_POR_PAGINA filas, sin límite de largo.
+    
     Args:
         spreadsheet_id: ID de la Google Sheet
         db: Sesión de base de datos
         usuario: Usuario que importa
-        rango: Rango de celdas (default: toda la hoja)
+        hoja: Nombre de la pestaña (default: la primera)
         actualizar_existentes: Si True, actualiza productos existentes
+        tareas: Si se entrega, se programan las alertas de stock bajo
     
     Retorna:
         Dict con resultados de la importación
     """
-    # Leer datos de Google Sheet
-    valores = leer_google_sheet(spreadsheet_id, rango)
-    
-    # Validar columnas
-    es_valido, mensaje_error = validar_columnas_sheet(valores)
-    if not es_valido:
-        raise HTTPException(status_code=400, detail=mensaje_error)
-    
-    # Extraer headers y datos
-    headers = [str(h).lower().strip() for h in valores[0]]
-    filas_datos = valores[1:]
-    
-    # Inicializar resultado
-    resultado = ExcelImportResult()
-    resultado.total = len(filas_datos)
-    
-    # Procesar cada fila
-    for index, fila in enumerate(filas_datos):
-        fila_num = index + 2  # +2 porque Google Sheets empieza en 1 y tiene header
-        
-        try:
-            # Parsear fila
-            datos = parsear_fila_sheet(fila, headers)
-            
-            if not datos:
-                continue  # Fila vacía
-            
-            # Validar datos
-            if not datos.get('nombre'):
-                resultado.agregar_error(fila_num, datos.get('sku', 'N/A'), "Nombre vacío")
-                continue
-            
-            if not datos.get('sku'):
-                resultado.agregar_error(fila_num, 'N/A', "SKU vacío")
-                continue
-            
-            if datos['stock_actual'] < 0:
-                resultado.agregar_error(fila_num, datos['sku'], "Stock actual no puede ser negativo")
-                continue
-            
-            if datos['stock_minimo'] < 0:
-                resultado.agregar_error(fila_num, datos['sku'], "Stock mínimo no puede ser negativo")
-                continue
-            
-            # Verificar si el producto ya existe
-            producto_existente = db.query(Product).filter(
-                Product.sku == datos['sku'],
-                Product.usuario_id == usuario.id
-            ).first()
-            
-            if producto_existente:
-                if actualizar_existentes:
-                    # Actualizar
-                    producto_existente.nombre = datos['nombre']
-                    producto_existente.stock_actual = datos['stock_actual']
-                    producto_existente.stock_minimo = datos['stock_minimo']
-                    
-                    if producto_existente.stock_actual > producto_existente.stock_minimo:
-                        producto_existente.alerta_enviada = False
-                    
-                    db.commit()
-                    resultado.agregar_exito(
-                        fila_num,
-                        datos['sku'],
-                        "actualizado",
-                        f"Stock: {producto_existente.stock_actual}"
-                    )
-                else:
-                    resultado.agregar_error(
-                        fila_num,
-                        datos['sku'],
-                        "SKU duplicado"
-                    )
-            else:
-                # Crear nuevo
-                nuevo_producto = Product(
-                    nombre=datos['nombre'],
-                    sku=datos['sku'],
-                    stock_actual=datos['stock_actual'],
-                    stock_minimo=datos['stock_minimo'],
-                    usuario_id=usuario.id
-                )
-                
-                db.add(nuevo_producto)
-                db.commit()
-                
-                resultado.agregar_exito(fila_num, datos['sku'], "creado")
-        
-        except Exception as e:
-            db.rollback()
-            resultado.agregar_error(
-                fila_num,
-                datos.get('sku', 'N/A') if datos else 'N/A',
-                f"Error: {str(e)}"
-            )
-    
-    return resultado.to_dict()
+    # Las llamadas a la API y a la BD bloquean: todo se hace en un hilo aparte
+    return await ejecutar_importacion(
+        _importar_por_paginas, spreadsheet_id, db, usuario, hoja, actualizar_existentes, tareas
+    )
 
 
 def extraer_spreadsheet_id_de_url(url: str) -> str:
@@ -333,11 +461,7 @@ def extraer_spreadsheet_id_de_url(url: str) -> str:
     Raises:
         ValueError: Si la URL no es válida
     """
-    import re
-    
-    # Patrón para extraer ID
-    patron = r'/spreadsheets/d/([a-zA-Z0-9-_]+)'
-    match = re.search(patron, url)
+    match = _SHEET_ID_RE.search(url)
     
     if match:
         return match.group(1)
@@ -354,7 +478,7 @@ def extraer_spreadsheet_id_de_url(url: str) -> str:
 #     spreadsheet_url: str,
 #     actualizar: bool = False,
 #     db: Session = Depends(get_db),
-#     user: User = Depends(get_current_user)
+#     user: AuthUser = Depends(get_current_user)
 # ):
 #     # Extraer ID de la URL
 #     spreadsheet_id = extraer_spreadsheet_id_de_url(spreadsheet_url)
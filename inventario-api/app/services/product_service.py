@@ -9,20 +9,22 @@ SEPARACIÓN DE RESPONSABILIDADES:
 - Models (models/product.py): Define estructura de datos
 """
 
+from sqlalchemy import delete, func, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from fastapi import HTTPException, status
-from typing import List, Optional
+from fastapi import BackgroundTasks, HTTPException, status
+from typing import List, Optional, Tuple
 
-from app.models import Product, User
+from app.auth import AuthUser
+from app.models import Product
 from app.schemas import ProductCreate, ProductUpdate, StockUpdate
-from app.services.alert_service import enviar_alerta_stock_bajo
+from app.services.alert_service import programar_alerta_stock_bajo
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def crear_producto(db: Session, producto_data: ProductCreate, usuario: User) -> Product:
+def crear_producto(db: Session, producto_data: ProductCreate, usuario: AuthUser) -> Product:
     """
     Crea un nuevo producto en la base de datos.
     
@@ -66,40 +68,57 @@ def crear_producto(db: Session, producto_data: ProductCreate, usuario: User) ->
 
 def listar_productos(
     db: Session, 
-    usuario: User, 
+    usuario: AuthUser, 
     skip: int = 0, 
     limit: int = 100,
-    stock_bajo: Optional[bool] = None
-) -> List[Product]:
+    stock_bajo: Optional[bool] = None,
+    despues_de_id: Optional[int] = None
+) -> Tuple[List[Product], int]:
     """
-    Lista los productos de un usuario.
+    Lista los productos de un usuario, ordenados por id.
+    
+    Para paginar conviene usar `despues_de_id` (el id del último producto
+    de la página anterior): la BD salta directo a ese punto con el índice
+    (usuario_id, id). Con `skip` tiene que recorrer y descartar todas las
+    filas anteriores, cada vez más lento en páginas altas.
     
     Args:
         db: Sesión de base de datos
         usuario: Usuario actual
-        skip: Número de productos a saltar (para paginación)
+        skip: Número de productos a saltar (se ignora si hay despues_de_id)
         limit: Máximo número de productos a devolver
         stock_bajo: Si True, solo devuelve productos con stock bajo
+        despues_de_id: Devuelve los productos con id mayor a este
     
     Retorna:
-        List[Product]: Lista de productos
+        tuple: (productos, total)
+            - productos: Productos de la página pedida
+            - total: Cuántos productos cumplen el filtro (sin paginar)
     """
-    # Query base: productos del usuario
-    query = db.query(Product).filter(Product.usuario_id == usuario.id)
+    # Filtro base: productos del usuario
+    filtros = [Product.usuario_id == usuario.id]
     
     # Filtrar por stock bajo si se especificó
     if stock_bajo is True:
         # Productos donde stock_actual <= stock_minimo
-        query = query.filter(Product.stock_actual <= Product.stock_minimo)
+        filtros.append(Product.stock_actual <= Product.stock_minimo)
+    
+    # Aplicar paginación (por cursor si viene despues_de_id)
+    consulta = select(Product).where(*filtros).order_by(Product.id)
+    if despues_de_id is not None:
+        consulta = consulta.where(Product.id > despues_de_id)
+    else:
+        consulta = consulta.offset(skip)
+    productos = db.scalars(consulta.limit(limit)).all()
     
-    # Aplicar paginación y devolver
-    productos = query.offset(skip).limit(limit).all()
+    # El total lo cuenta la BD (COUNT), sin traer las filas
+    total = db.scalar(select(func.count(Product.id)).where(*filtros))
     
-    logger.info(f"📋 Usuario {usuario.email} listó {len(productos)} productos")
-    return productos
+    logger.info(f"📋 Usuario {usuario.email} listó {len(productos)} de {total} productos")
+    return productos, total
 
 
-def obtener_producto(db: Session, producto_id: int, usuario: User) -> Product:
+def obtener_producto(db: Session, producto_id: int, usuario: AuthUser) -> Product:
     """
     Obtiene un producto específico.
     
@@ -132,7 +151,7 @@ def actualizar_producto(
     db: Session, 
     producto_id: int, 
     producto_data: ProductUpdate, 
-    usuario: User
+    usuario: AuthUser
 ) -> Product:
     """
     Actualiza un producto existente.
@@ -172,7 +191,8 @@ def actualizar_stock(
     db: Session, 
     producto_id: int, 
     stock_data: StockUpdate, 
-    usuario: User
+    usuario: AuthUser,
+    tareas: BackgroundTasks
 ) -> Product:
     """
     Actualiza solo el stock de un producto.
@@ -184,6 +204,7 @@ def actualizar_stock(
         producto_id: ID del producto
         stock_data: Nuevo valor de stock
         usuario: Usuario actual
+        tareas: Tareas en segundo plano de la petición (para el email)
     
     Retorna:
         Product: Producto con stock actualizado
@@ -202,16 +223,11 @@ def actualizar_stock(
         logger.info(f"🔄 Stock de {producto.sku} recuperado. Resetear alerta.")
     
     # Si el stock está bajo Y no se ha enviado alerta, enviarla
+    # (el email sale después de responder la petición)
     elif producto.necesita_alerta():
-        enviar_alerta_stock_bajo(
-            email_destino=usuario.email,
-            producto_nombre=producto.nombre,
-            sku=producto.sku,
-            stock_actual=producto.stock_actual,
-            stock_minimo=producto.stock_minimo
-        )
         producto.alerta_enviada = True
-        logger.warning(f"⚠️ Stock bajo en {producto.sku}. Alerta enviada.")
+        programar_alerta_stock_bajo(tareas, producto, usuario.email)
+        logger.warning(f"⚠️ Stock bajo en {producto.sku}. Alerta programada.")
     
     db.commit()
     db.refresh(producto)
@@ -223,7 +239,7 @@ def actualizar_stock(
     return producto
 
 
-def eliminar_producto(db: Session, producto_id: int, usuario: User) -> None:
+def eliminar_producto(db: Session, producto_id: int, usuario: AuthUser) -> None:
     """
     Elimina un producto.
     
@@ -235,9 +251,20 @@ def eliminar_producto(db: Session, producto_id: int, usuario: User) -> None:
     Raises:
         HTTPException: Si el producto no existe o no pertenece al usuario
     """
-    producto = obtener_producto(db, producto_id, usuario)
+    # Un solo DELETE filtrado por dueño: si no borró nada, el producto
+    # no existe o no es del usuario (no hace falta leerlo antes)
+    sku = db.execute(
+        delete(Product)
+        .where(Product.id == producto_id, Product.usuario_id == usuario.id)
+        .returning(Product.sku)
+    ).scalar_one_or_none()
+    
+    if sku is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto {producto_id} no encontrado"
+        )
     
-    db.delete(producto)
     db.commit()
     
-    logger.info(f"🗑️ Producto {producto.sku} eliminado por {usuario.email}")
+    logger.info(f"🗑️ Producto {sku} eliminado por {usuario.email}")
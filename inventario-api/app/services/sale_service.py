@@ -11,39 +11,49 @@ FLUJO IMPORTANTE:
 5. Verificar si necesita enviar alerta de stock bajo
 """
 
-from sqlalchemy.orm import Session
-from fastapi import HTTPException, status
-from typing import List
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session, aliased, contains_eager
+from fastapi import BackgroundTasks, HTTPException, status
+from typing import List, Optional
 
-from app.models import Sale, Product, User
+from app.auth import AuthUser
+from app.models import Sale, Product
 from app.schemas import SaleCreate
-from app.services.alert_service import enviar_alerta_stock_bajo
+from app.services.alert_service import programar_alerta_stock_bajo
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def registrar_venta(db: Session, venta_data: SaleCreate, usuario: User) -> tuple[Sale, bool]:
+def registrar_venta(
+    db: Session,
+    venta_data: SaleCreate,
+    usuario: AuthUser,
+    tareas: BackgroundTasks
+) -> tuple[Sale, bool]:
     """
     Registra una nueva venta y descuenta el stock automáticamente.
     
     PROCESO:
-    1. Buscar el producto
-    2. Verificar que pertenece al usuario
-    3. Verificar que hay stock suficiente
-    4. Descontar el stock
+    1-4. Descontar el stock en un solo UPDATE atómico, que solo aplica si
+         el producto existe, pertenece al usuario y tiene stock suficiente
     5. Crear el registro de venta
-    6. Verificar si necesita enviar alerta
+    6. Verificar si necesita enviar alerta (se envía después de responder)
+    
+    Como la verificación y el descuento ocurren en la misma sentencia,
+    dos ventas simultáneas del mismo producto no pueden dejar el stock
+    negativo.
     
     Args:
         db: Sesión de base de datos
         venta_data: Datos de la venta (producto_id, cantidad)
         usuario: Usuario actual
+        tareas: Tareas en segundo plano de la petición (para el email)
     
     Retorna:
         tuple: (Sale, alerta_enviada)
             - Sale: Registro de venta creado
-            - alerta_enviada: True si se envió alerta de stock bajo
+            - alerta_enviada: True si se programó alerta de stock bajo
     
     Raises:
         HTTPException: Si el producto no existe, no pertenece al usuario,
@@ -51,51 +61,30 @@ def registrar_venta(db: Session, venta_data: SaleCreate, usuario: User) -> tuple
     """
     
     # ============================================
-    # 1. BUSCAR EL PRODUCTO
+    # 1-4. VERIFICAR Y DESCONTAR EL STOCK (ATÓMICO)
     # ============================================
     
-    producto = db.query(Product).filter(
-        Product.id == venta_data.producto_id
-    ).first()
-    
-    if not producto:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Producto {venta_data.producto_id} no encontrado"
+    # UPDATE ... WHERE stock_actual >= cantidad RETURNING ...
+    # La BD bloquea la fila mientras la actualiza, así que la condición
+    # se evalúa siempre contra el stock real
+    producto = db.scalars(
+        update(Product)
+        .where(
+            Product.id == venta_data.producto_id,
+            Product.usuario_id == usuario.id,
+            Product.stock_actual >= venta_data.cantidad
         )
+        .values(stock_actual=Product.stock_actual - venta_data.cantidad)
+        .returning(Product)
+    ).first()
     
-    
-    # ============================================
-    # 2. VERIFICAR QUE PERTENECE AL USUARIO
-    # ============================================
-    
-    if producto.usuario_id != usuario.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para vender este producto"
-        )
-    
-    
-    # ============================================
-    # 3. VERIFICAR STOCK SUFICIENTE
-    # ============================================
-    
-    if not producto.puede_vender(venta_data.cantidad):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Stock insuficiente. Disponible: {producto.stock_actual}, Solicitado: {venta_data.cantidad}"
-        )
-    
-    
-    # ============================================
-    # 4. DESCONTAR EL STOCK
-    # ============================================
-    
-    stock_anterior = producto.stock_actual
-    producto.stock_actual -= venta_data.cantidad
+    if producto is None:
+        # No se descontó nada: averiguar por qué para devolver el error correcto
+        _rechazar_venta(db, venta_data, usuario)
     
     logger.info(
-        f"📉 Stock de {producto.sku} descontado: {stock_anterior} → {producto.stock_actual}"
+        f"📉 Stock de {producto.sku} descontado: "
+        f"{producto.stock_actual + venta_data.cantidad} → {producto.stock_actual}"
     )
     
     
@@ -118,21 +107,14 @@ def registrar_venta(db: Session, venta_data: SaleCreate, usuario: User) -> tuple
     alerta_enviada = False
     
     if producto.necesita_alerta():
-        # Enviar alerta por email
-        exito = enviar_alerta_stock_bajo(
-            email_destino=usuario.email,
-            producto_nombre=producto.nombre,
-            sku=producto.sku,
-            stock_actual=producto.stock_actual,
-            stock_minimo=producto.stock_minimo
+        # Marcar la alerta en esta misma transacción y enviar el email
+        # después de responder (si el envío falla, la bandera se libera)
+        producto.alerta_enviada = True
+        alerta_enviada = True
+        programar_alerta_stock_bajo(tareas, producto, usuario.email)
+        logger.warning(
+            f"⚠️ Stock de {producto.sku} bajo mínimo. Alerta programada para {usuario.email}"
         )
-        
-        if exito:
-            producto.alerta_enviada = True
-            alerta_enviada = True
-            logger.warning(
-                f"⚠️ Stock de {producto.sku} bajo mínimo. Alerta enviada a {usuario.email}"
-            )
     
     
     # ============================================
@@ -150,28 +132,76 @@ def registrar_venta(db: Session, venta_data: SaleCreate, usuario: User) -> tuple
     return nueva_venta, alerta_enviada
 
 
+def _rechazar_venta(db: Session, venta_data: SaleCreate, usuario: AuthUser) -> None:
+    """
+    Lanza el error adecuado cuando el UPDATE de registrar_venta no aplicó.
+    
+    Solo se llama en el camino de error, así una venta exitosa no paga
+    esta consulta extra.
+    
+    Raises:
+        HTTPException: 404 si el producto no existe, 403 si es de otro
+                      usuario, 400 si no hay stock suficiente
+    """
+    # Solo hacen falta el dueño y el stock: se piden esas dos columnas
+    # en vez de cargar el producto completo
+    producto = db.execute(
+        select(Product.usuario_id, Product.stock_actual).where(
+            Product.id == venta_data.producto_id
+        )
+    ).first()
+    
+    if not producto:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto {venta_data.producto_id} no encontrado"
+        )
+    
+    if producto.usuario_id != usuario.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permiso para vender este producto"
+        )
+    
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Stock insuficiente. Disponible: {producto.stock_actual}, Solicitado: {venta_data.cantidad}"
+    )
+
+
 def listar_ventas(
     db: Session, 
-    usuario: User, 
+    usuario: AuthUser, 
     producto_id: int = None,
     skip: int = 0, 
-    limit: int = 100
+    limit: int = 100,
+    antes_de_id: Optional[int] = None
 ) -> List[Sale]:
     """
-    Lista las ventas de un usuario.
+    Lista las ventas de un usuario (más recientes primero).
+    
+    Para paginar conviene usar `antes_de_id` (el id de la última venta de
+    la página anterior) en vez de `skip`: la BD continúa desde esa venta
+    sin recorrer las anteriores.
     
     Args:
         db: Sesión de base de datos
         usuario: Usuario actual
         producto_id: Si se especifica, filtra por producto
-        skip: Número de ventas a saltar (paginación)
+        skip: Número de ventas a saltar (se ignora si hay antes_de_id)
         limit: Máximo número de ventas a devolver
+        antes_de_id: Devuelve las ventas que van después de esta en el orden
+                     (debe ser una venta del usuario; si no, la lista sale vacía)
     
     Retorna:
         List[Sale]: Lista de ventas
     """
     # Query base: ventas de productos del usuario
-    query = db.query(Sale).join(Product).filter(
+    # contains_eager llena venta.product con las columnas del mismo JOIN,
+    # así leer venta.product.nombre no hace una consulta extra por venta
+    query = db.query(Sale).join(Product).options(
+        contains_eager(Sale.product)
+    ).filter(
         Product.usuario_id == usuario.id
     )
     
@@ -179,17 +209,33 @@ def listar_ventas(
     if producto_id:
         query = query.filter(Sale.producto_id == producto_id)
     
-    # Ordenar por fecha (más recientes primero)
-    query = query.order_by(Sale.fecha.desc())
-    
-    # Aplicar paginación
-    ventas = query.offset(skip).limit(limit).all()
+    # Ordenar por fecha (más recientes primero); el id desempata ventas
+    # con la misma fecha, así el orden es estable entre páginas
+    query = query.order_by(Sale.fecha.desc(), Sale.id.desc())
+    
+    # Aplicar paginación (por cursor si viene antes_de_id)
+    if antes_de_id is not None:
+        # La fecha del cursor solo se toma si la venta es del usuario: con
+        # el id de una venta ajena la subconsulta da NULL y la página sale
+        # vacía (no se filtra información de ventas de otros usuarios)
+        venta_cursor = aliased(Sale)
+        producto_cursor = aliased(Product)
+        fecha_cursor = (
+            select(venta_cursor.fecha)
+            .join(producto_cursor, venta_cursor.producto_id == producto_cursor.id)
+            .where(venta_cursor.id == antes_de_id, producto_cursor.usuario_id == usuario.id)
+            .scalar_subquery()
+        )
+        query = query.filter(tuple_(Sale.fecha, Sale.id) < tuple_(fecha_cursor, antes_de_id))
+    else:
+        query = query.offset(skip)
+    ventas = query.limit(limit).all()
     
     logger.info(f"📊 Usuario {usuario.email} listó {len(ventas)} ventas")
     return ventas
 
 
-def obtener_venta(db: Session, venta_id: int, usuario: User) -> Sale:
+def obtener_venta(db: Session, venta_id: int, usuario: AuthUser) -> Sale:
     """
     Obtiene una venta específica.
     
@@ -204,7 +250,9 @@ def obtener_venta(db: Session, venta_id: int, usuario: User) -> Sale:
     Raises:
         HTTPException: Si la venta no existe o no pertenece al usuario
     """
-    venta = db.query(Sale).join(Product).filter(
+    venta = db.query(Sale).join(Product).options(
+        contains_eager(Sale.product)
+    ).filter(
         Sale.id == venta_id,
         Product.usuario_id == usuario.id
     ).first()
@@ -222,7 +270,7 @@ def obtener_venta(db: Session, venta_id: int, usuario: User) -> Sale:
 # FUNCIONES AUXILIARES
 # ============================================
 
-def obtener_estadisticas_ventas(db: Session, usuario: User) -> dict:
+def obtener_estadisticas_ventas(db: Session, usuario: AuthUser) -> dict:
     """
     Obtiene estadísticas de ventas del usuario.
     
@@ -233,31 +281,42 @@ def obtener_estadisticas_ventas(db: Session, usuario: User) -> dict:
     Retorna:
         dict: Estadísticas (total_ventas, productos_mas_vendidos, etc.)
     """
-    from sqlalchemy import func
-    
-    # Total de ventas
-    total_ventas = db.query(func.count(Sale.id)).join(Product).filter(
+    # Ventas y unidades por producto (un solo JOIN para todo)
+    por_producto = select(
+        Product.nombre,
+        func.count(Sale.id).label('ventas'),
+        func.sum(Sale.cantidad).label('unidades')
+    ).join(Sale).where(
         Product.usuario_id == usuario.id
-    ).scalar()
+    ).group_by(Product.nombre).cte('por_producto')
+    
+    # Una sola consulta: la fila del producto más vendido, con los totales
+    # de todos los productos calculados como ventanas (OVER ()).
+    # Sin ventas no hay filas
+    fila = db.execute(
+        select(
+            por_producto.c.nombre,
+            por_producto.c.unidades,
+            func.sum(por_producto.c.ventas).over(),
+            func.sum(por_producto.c.unidades).over()
+        ).order_by(por_producto.c.unidades.desc()).limit(1)
+    ).first()
     
-    # Total de unidades vendidas
-    total_unidades = db.query(func.sum(Sale.cantidad)).join(Product).filter(
-        Product.usuario_id == usuario.id
-    ).scalar() or 0
+    if fila is None:
+        return {
+            "total_ventas": 0,
+            "total_unidades_vendidas": 0,
+            "producto_mas_vendido": {"nombre": None, "cantidad": 0}
+        }
     
-    # Producto más vendido
-    producto_mas_vendido = db.query(
-        Product.nombre,
-        func.sum(Sale.cantidad).label('total')
-    ).join(Sale).filter(
-        Product.usuario_id == usuario.id
-    ).group_by(Product.nombre).order_by(func.sum(Sale.cantidad).desc()).first()
+    nombre, cantidad, total_ventas, total_unidades = fila
     
+    # SUM sobre SUM devuelve NUMERIC en PostgreSQL: se pasa a int
     return {
-        "total_ventas": total_ventas,
-        "total_unidades_vendidas": total_unidades,
+        "total_ventas": int(total_ventas),
+        "total_unidades_vendidas": int(total_unidades),
         "producto_mas_vendido": {
-            "nombre": producto_mas_vendido[0] if producto_mas_vendido else None,
-            "cantidad": producto_mas_vendido[1] if producto_mas_vendido else 0
+            "nombre": nombre,
+            "cantidad": int(cantidad)
         }
     }
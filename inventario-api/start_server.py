@@ -4,11 +4,20 @@ Script para iniciar el servidor de desarrollo.
 
 Uso:
     python start_server.py
+
+Con ENVIRONMENT=production (en el entorno o en .env) se inicia sin
+auto-reload y con un proceso (worker) por núcleo de CPU. uvicorn no permite
+usar --reload y --workers al mismo tiempo.
+
+Cada worker tiene su propio pool de conexiones a la BD (pool_size 5 +
+max_overflow 10, ver app/database.py): el máximo de conexiones abiertas es
+workers × 15. Revisa que tu base de datos acepte esa cantidad.
 """
 
 import os
 import sys
 import subprocess
+from importlib.util import find_spec
 
 def check_env_file():
     """Verifica que exista el archivo .env"""
@@ -22,33 +31,49 @@ def check_env_file():
 
 def check_dependencies():
     """Verifica que las dependencias estén instaladas"""
-    try:
-        import fastapi
-        import uvicorn
-        import sqlalchemy
-        return True
-    except ImportError:
-        print("❌ Error: Faltan dependencias")
+    # find_spec solo busca el paquete, sin importarlo (importar fastapi y
+    # sqlalchemy tarda; uvicorn los vuelve a cargar en su propio proceso)
+    faltantes = [modulo for modulo in ("fastapi", "uvicorn", "sqlalchemy") if find_spec(modulo) is None]
+    if faltantes:
+        print(f"❌ Error: Faltan dependencias ({', '.join(faltantes)})")
         print("📦 Instala las dependencias con:")
         print("   pip install -r requirements.txt")
         return False
+    return True
 
 
 def start_server():
     """Inicia el servidor de desarrollo"""
-    print("🚀 Iniciando servidor de desarrollo...")
+    # Se lee con la misma configuración que usa la app (entorno y .env)
+    from app.config import get_settings
+    produccion = get_settings().environment == "production"
+    
+    comando = [
+        "uvicorn",
+        "app.main:app",
+        "--host", "0.0.0.0",
+        "--port", "8000",
+        # uvloop (event loop) y httptools (parser HTTP) vienen con
+        # uvicorn[standard] y son más rápidos que los de Python
+        "--loop", "uvloop",
+        "--http", "httptools"
+    ]
+    
+    if produccion:
+        # Un proceso por núcleo: cada uno atiende peticiones en paralelo
+        workers = os.cpu_count() or 1
+        comando += ["--workers", str(workers)]
+        print(f"🚀 Iniciando servidor con {workers} workers...")
+    else:
+        comando.append("--reload")
+        print("🚀 Iniciando servidor de desarrollo...")
+        print("🔄 Auto-reload activado")
+    
     print("📖 Documentación: http://localhost:8000/docs")
-    print("🔄 Auto-reload activado")
     print("\n" + "="*60 + "\n")
     
     try:
-        subprocess.run([
-            "uvicorn",
-            "app.main:app",
-            "--reload",
-            "--host", "0.0.0.0",
-            "--port", "8000"
-        ])
+        subprocess.run(comando)
     except KeyboardInterrupt:
         print("\n\n👋 Servidor detenido")
 
@@ -6,16 +6,72 @@ Este script demuestra cómo usar todos los endpoints de la API.
 Para ejecutarlo:
     python test_api.py
 
+Para ver también el JSON de cada respuesta:
+    TEST_VERBOSE=1 python test_api.py
+
+Contra una API que ya se sabe levantada (CI, pruebas repetidas) se puede
+omitir el Health Check:
+    SKIP_HEALTHCHECK=1 python test_api.py
+
 IMPORTANTE: Asegúrate de que la API esté corriendo en http://localhost:8000
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import itertools
 import json
-from datetime import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la librería estándar
+    orjson = None
 
 # URL base de la API
 BASE_URL = "http://localhost:8000"
 
+# Identificadores únicos para emails y SKUs de prueba: una base en
+# nanosegundos tomada al inicio más un contador (no se repiten aunque dos
+# pruebas corran en el mismo segundo)
+_UID_BASE = time.time_ns()
+_UID_COUNTER = itertools.count()
+
+
+# Con TEST_VERBOSE=1 se imprime el JSON completo de cada respuesta
+VERBOSE = os.getenv("TEST_VERBOSE") == "1"
+
+# Línea divisoria entre pruebas
+_SEP = "\n" + "-"*60 + "\n"
+
+# Con SKIP_HEALTHCHECK=1 no se prueba "/" antes de empezar
+SKIP_HEALTHCHECK = os.getenv("SKIP_HEALTHCHECK") == "1"
+
+# Se marca en True cuando el Health Check pasa una vez: si main() se ejecuta
+# varias veces en el mismo proceso no se vuelve a consultar
+_api_disponible = False
+
+# Sesión HTTP compartida por todas las pruebas: reutiliza la misma conexión
+# (keep-alive) en vez de abrir una nueva en cada petición
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Timeout de cada petición (conexión, lectura) en segundos: si la API se
+# cuelga la prueba falla en vez de quedarse esperando para siempre
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Las pruebas de solo lectura corren en paralelo: cada una junta sus
+# mensajes en un buffer propio (por hilo) y los escribe de una sola vez al
+# terminar, con este lock para que los bloques no se mezclen en la consola
+_print_lock = threading.Lock()
+_salida = threading.local()
+
 # Colores para la consola
 class Colors:
     GREEN = '\033[92m'
@@ -25,49 +81,160 @@ class Colors:
     END = '\033[0m'
 
 
+def _emitir(texto):
+    """Escribe una línea, o la guarda si el hilo tiene la salida agrupada."""
+    lineas = getattr(_salida, "lineas", None)
+    if lineas is not None:
+        lineas.append(texto)
+        return
+    
+    with _print_lock:
+        print(texto)
+
+
+@contextmanager
+def salida_agrupada():
+    """Junta todo lo que se imprima dentro del bloque y lo escribe al final."""
+    _salida.lineas = []
+    try:
+        yield
+    finally:
+        lineas, _salida.lineas = _salida.lineas, None
+        with _print_lock:
+            sys.stdout.write("\n".join(lineas) + "\n\n")
+            sys.stdout.flush()
+
+
+def ejecutar(test, *args):
+    """Ejecuta una prueba con su salida agrupada (para correrla en paralelo)."""
+    with salida_agrupada():
+        return test(*args)
+
+
 def print_success(message):
     """Imprime mensaje de éxito en verde."""
-    print(f"{Colors.GREEN}✅ {message}{Colors.END}")
+    _emitir(f"{Colors.GREEN}✅ {message}{Colors.END}")
 
 
 def print_error(message):
     """Imprime mensaje de error en rojo."""
-    print(f"{Colors.RED}❌ {message}{Colors.END}")
+    _emitir(f"{Colors.RED}❌ {message}{Colors.END}")
 
 
 def print_info(message):
     """Imprime mensaje informativo en azul."""
-    print(f"{Colors.BLUE}ℹ️  {message}{Colors.END}")
+    _emitir(f"{Colors.BLUE}ℹ️  {message}{Colors.END}")
 
 
 def print_warning(message):
     """Imprime mensaje de advertencia en amarillo."""
-    print(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
+    _emitir(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
 
 
 def print_json(data):
-    """Imprime JSON formateado."""
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    """Imprime JSON formateado (solo con TEST_VERBOSE=1)."""
+    if not VERBOSE:
+        return
+    
+    if orjson is not None:
+        texto = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    else:
+        texto = json.dumps(data, indent=2, ensure_ascii=False)
+    _emitir(texto)
+
+
+def separador():
+    """Imprime una línea divisoria entre pruebas (solo con TEST_VERBOSE=1)."""
+    if VERBOSE:
+        _emitir(_SEP)
+
+
+def uid():
+    """Retorna un identificador único para esta ejecución."""
+    return f"{_UID_BASE}_{next(_UID_COUNTER)}"
+
+
+def leer_json(response):
+    """Decodifica el cuerpo JSON de una respuesta (con orjson si está instalado)."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def peticion(metodo, ruta, **kwargs):
+    """
+    Hace una petición a la API con la sesión compartida y DEFAULT_TIMEOUT.
+    
+    Los errores de red (timeout, conexión rechazada, etc.) se informan con
+    print_error y no se propagan: la prueba falla y las que dependen de
+    ella se omiten, sin cortar el resto de la ejecución.
+    
+    Retorna:
+        La respuesta, o None si la petición no se pudo completar
+    """
+    try:
+        return SESSION.request(metodo, f"{BASE_URL}{ruta}", timeout=DEFAULT_TIMEOUT, **kwargs)
+    except requests.exceptions.Timeout:
+        print_error(f"La API no respondió a tiempo ({metodo} {ruta})")
+    except requests.exceptions.ConnectionError:
+        print_error(f"No se pudo conectar a la API. ¿Está corriendo en {BASE_URL}?")
+    except requests.exceptions.RequestException as e:
+        print_error(f"Error en la petición {metodo} {ruta}: {e}")
+    return None
+
+
+def verificar(response, esperado, exito, error, leer=False):
+    """
+    Revisa el código de estado de una respuesta e imprime el resultado.
+    
+    Args:
+        response: Respuesta de peticion() (None si la petición falló)
+        esperado: Código de estado esperado (ej: 200)
+        exito: Mensaje si el código es el esperado
+        error: Mensaje si no lo es
+        leer: Si es True retorna el JSON de la respuesta; si no, el cuerpo
+              solo se decodifica para imprimirlo con TEST_VERBOSE=1
+    
+    Retorna:
+        El JSON de la respuesta (o True si leer=False) si el código es el
+        esperado, None si no
+    """
+    if response is None:
+        return None
+    
+    if response.status_code != esperado:
+        print_error(f"{error} (código {response.status_code})")
+        if VERBOSE:
+            # Un error puede no venir en JSON (ej: página HTML de un proxy)
+            try:
+                print_json(leer_json(response))
+            except ValueError:
+                _emitir(response.text)
+        return None
+    
+    print_success(exito)
+    if not (leer or VERBOSE):
+        return True
+    
+    data = leer_json(response)
+    print_json(data)
+    return data if leer else True
 
 
 def test_health_check():
     """Prueba que la API esté funcionando."""
     print_info("Probando Health Check...")
     
-    try:
-        response = requests.get(f"{BASE_URL}/")
-        
-        if response.status_code == 200:
-            print_success("API está funcionando")
-            print_json(response.json())
-            return True
-        else:
-            print_error(f"API respondió con código {response.status_code}")
-            return False
-    
-    except requests.exceptions.ConnectionError:
-        print_error("No se pudo conectar a la API. ¿Está corriendo en http://localhost:8000?")
-        return False
+    response = peticion("GET", "/")
+    return verificar(response, 200, "API está funcionando", "La API no respondió correctamente") is not None
+
+
+def api_disponible():
+    """Ejecuta el Health Check solo hasta que pase una vez en este proceso."""
+    global _api_disponible
+    if not _api_disponible:
+        _api_disponible = test_health_check()
+    return _api_disponible
 
 
 def test_register_user():
@@ -75,25 +242,14 @@ def test_register_user():
     print_info("Probando registro de usuario...")
     
     # Generar email único para evitar conflictos
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    
     user_data = {
         "nombre": "Usuario de Prueba",
-        "email": f"prueba_{timestamp}@ejemplo.cl",
+        "email": f"prueba_{uid()}@ejemplo.cl",
         "password": "password123"
     }
     
-    response = requests.post(f"{BASE_URL}/auth/register", json=user_data)
-    
-    if response.status_code == 201:
-        print_success("Usuario registrado exitosamente")
-        user = response.json()
-        print_json(user)
-        return user
-    else:
-        print_error("Error al registrar usuario")
-        print_json(response.json())
-        return None
+    response = peticion("POST", "/auth/register", json=user_data)
+    return verificar(response, 201, "Usuario registrado exitosamente", "Error al registrar usuario", leer=True)
 
 
 def test_login(email, password):
@@ -105,79 +261,65 @@ def test_login(email, password):
         "password": password
     }
     
-    response = requests.post(f"{BASE_URL}/auth/login", json=credentials)
-    
-    if response.status_code == 200:
-        print_success("Login exitoso")
-        data = response.json()
-        print_info(f"Token: {data['access_token'][:50]}...")
-        return data['access_token']
-    else:
-        print_error("Error en login")
-        print_json(response.json())
+    response = peticion("POST", "/auth/login", json=credentials)
+    data = verificar(response, 200, "Login exitoso", "Error en login", leer=True)
+    if data is None:
         return None
+    
+    print_info(f"Token: {data['access_token'][:50]}...")
+    return data['access_token']
 
 
-def test_get_profile(token):
+def test_get_profile():
     """Prueba obtener perfil del usuario."""
     print_info("Probando obtener perfil...")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{BASE_URL}/auth/me", headers=headers)
-    
-    if response.status_code == 200:
-        print_success("Perfil obtenido")
-        print_json(response.json())
-        return True
-    else:
-        print_error("Error al obtener perfil")
-        return False
+    response = peticion("GET", "/auth/me")
+    return verificar(response, 200, "Perfil obtenido", "Error al obtener perfil") is not None
 
 
-def test_create_product(token):
+def test_create_product():
     """Prueba crear un producto."""
     print_info("Probando crear producto...")
     
     product_data = {
         "nombre": "Producto de Prueba",
-        "sku": f"PROD-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "sku": f"PROD-{uid()}",
         "stock_actual": 100,
         "stock_minimo": 20
     }
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{BASE_URL}/products", json=product_data, headers=headers)
+    response = peticion("POST", "/products", json=product_data)
+    return verificar(response, 201, "Producto creado", "Error al crear producto", leer=True)
+
+
+def test_malformed_body():
+    """Prueba que un cuerpo JSON mal formado se rechace con 422 (no 500)."""
+    print_info("Probando crear producto con JSON mal formado...")
     
-    if response.status_code == 201:
-        print_success("Producto creado")
-        product = response.json()
-        print_json(product)
-        return product
-    else:
-        print_error("Error al crear producto")
-        print_json(response.json())
-        return None
+    response = peticion(
+        "POST",
+        "/products",
+        data=b'{"nombre": "Producto de Prueba", "sku": ',
+        headers={"Content-Type": "application/json"}
+    )
+    return verificar(response, 422, "JSON mal formado rechazado", "JSON mal formado no se rechazó con 422") is not None
 
 
-def test_list_products(token):
+def test_list_products():
     """Prueba listar productos."""
     print_info("Probando listar productos...")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{BASE_URL}/products", headers=headers)
-    
-    if response.status_code == 200:
-        print_success("Productos listados")
-        data = response.json()
-        print_info(f"Total de productos: {data['total']}")
-        print_json(data)
-        return True
-    else:
-        print_error("Error al listar productos")
+    response = peticion("GET", "/products")
+    data = verificar(response, 200, "Productos listados", "Error al listar productos", leer=True)
+    if data is None:
         return False
+    
+    print_info(f"Total de productos: {data['total']}")
+    return True
 
 
-def test_update_stock(token, product_id):
+def test_update_stock(product_id):
     """Prueba actualizar el stock de un producto."""
     print_info(f"Probando actualizar stock del producto {product_id}...")
     
@@ -185,23 +327,11 @@ def test_update_stock(token, product_id):
         "stock_actual": 150
     }
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.put(
-        f"{BASE_URL}/products/{product_id}/stock",
-        json=stock_data,
-        headers=headers
-    )
-    
-    if response.status_code == 200:
-        print_success("Stock actualizado")
-        print_json(response.json())
-        return True
-    else:
-        print_error("Error al actualizar stock")
-        return False
+    response = peticion("PUT", f"/products/{product_id}/stock", json=stock_data)
+    return verificar(response, 200, "Stock actualizado", "Error al actualizar stock") is not None
 
 
-def test_create_sale(token, product_id):
+def test_create_sale(product_id):
     """Prueba registrar una venta."""
     print_info(f"Probando registrar venta del producto {product_id}...")
     
@@ -210,56 +340,115 @@ def test_create_sale(token, product_id):
         "cantidad": 145  # Esto dejará el stock en 5, bajo el mínimo de 20
     }
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{BASE_URL}/sales", json=sale_data, headers=headers)
-    
-    if response.status_code == 201:
-        print_success("Venta registrada")
-        data = response.json()
-        
-        if data['alerta_enviada']:
-            print_warning("Se envió alerta de stock bajo")
-        
-        print_json(data)
-        return data['venta']
-    else:
-        print_error("Error al registrar venta")
-        print_json(response.json())
+    response = peticion("POST", "/sales", json=sale_data)
+    data = verificar(response, 201, "Venta registrada", "Error al registrar venta", leer=True)
+    if data is None:
         return None
+    
+    if data['alerta_enviada']:
+        print_warning("Se envió alerta de stock bajo")
+    
+    return data['venta']
 
 
-def test_list_sales(token):
+def test_list_sales():
     """Prueba listar ventas."""
     print_info("Probando listar ventas...")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{BASE_URL}/sales", headers=headers)
-    
-    if response.status_code == 200:
-        print_success("Ventas listadas")
-        data = response.json()
-        print_info(f"Total de ventas: {data['total']}")
-        print_json(data)
-        return True
-    else:
-        print_error("Error al listar ventas")
+    response = peticion("GET", "/sales")
+    data = verificar(response, 200, "Ventas listadas", "Error al listar ventas", leer=True)
+    if data is None:
         return False
+    
+    print_info(f"Total de ventas: {data['total']}")
+    return True
 
 
-def test_sales_stats(token):
+def test_sales_stats():
     """Prueba obtener estadísticas de ventas."""
     print_info("Probando obtener estadísticas...")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{BASE_URL}/sales/stats/summary", headers=headers)
-    
-    if response.status_code == 200:
-        print_success("Estadísticas obtenidas")
-        print_json(response.json())
-        return True
-    else:
-        print_error("Error al obtener estadísticas")
-        return False
+    response = peticion("GET", "/sales/stats/summary")
+    return verificar(response, 200, "Estadísticas obtenidas", "Error al obtener estadísticas") is not None
+
+
+def iniciar_sesion(user):
+    """Hace login y deja el token en la sesión para las peticiones siguientes."""
+    token = test_login(user['email'], "password123")
+    if token:
+        SESSION.headers["Authorization"] = f"Bearer {token}"
+    return token
+
+
+# Pruebas y sus dependencias: (nombre, pruebas de las que depende, función).
+# La función recibe los resultados de las pruebas ya terminadas. Una prueba
+# corre apenas terminan sus dependencias, en paralelo con las demás que
+# estén listas; si alguna dependencia falla (retorna None o False), la
+# prueba se omite
+PRUEBAS = [
+    ("registro", [], lambda r: test_register_user()),
+    ("login", ["registro"], lambda r: iniciar_sesion(r["registro"])),
+    ("perfil", ["login"], lambda r: test_get_profile()),
+    ("crear_producto", ["login"], lambda r: test_create_product()),
+    ("json_mal_formado", ["login"], lambda r: test_malformed_body()),
+    ("listar_productos", ["crear_producto"], lambda r: test_list_products()),
+    ("actualizar_stock", ["crear_producto"], lambda r: test_update_stock(r["crear_producto"]["id"])),
+    # La venta de 145 unidades necesita el stock ya actualizado a 150
+    ("venta", ["crear_producto", "actualizar_stock"], lambda r: test_create_sale(r["crear_producto"]["id"])),
+    ("listar_ventas", ["venta"], lambda r: test_list_sales()),
+    ("estadisticas", ["venta"], lambda r: test_sales_stats())
+]
+
+
+def ejecutar_pruebas(pruebas, max_workers=4):
+    """
+    Ejecuta las pruebas respetando sus dependencias.
+    
+    Args:
+        pruebas: Lista de (nombre, dependencias, función), como PRUEBAS
+        max_workers: Cantidad máxima de pruebas corriendo a la vez
+    
+    Retorna:
+        Diccionario {nombre: resultado}. Las pruebas omitidas quedan en None
+    
+    Raises:
+        ValueError: Si alguna prueba depende de una que no existe (o hay
+                    un ciclo) y por lo tanto nunca podría ejecutarse
+    """
+    resultados = {}
+    pendientes = {nombre: (dependencias, funcion) for nombre, dependencias, funcion in pruebas}
+    en_curso = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pendientes or en_curso:
+            cantidad_pendientes = len(pendientes)
+            for nombre, (dependencias, funcion) in list(pendientes.items()):
+                fallidas = [d for d in dependencias if d in resultados and resultados[d] in (None, False)]
+                if fallidas:
+                    del pendientes[nombre]
+                    resultados[nombre] = None
+                    print_warning(f"Se omite '{nombre}': falló '{fallidas[0]}'")
+                elif all(d in resultados for d in dependencias):
+                    del pendientes[nombre]
+                    en_curso[executor.submit(ejecutar, funcion, resultados)] = nombre
+            
+            # Si no hay nada corriendo, las omisiones de esta vuelta pueden
+            # haber resuelto otras pendientes: se revisan de nuevo. Si la
+            # vuelta no avanzó, las que quedan nunca van a estar listas
+            if not en_curso:
+                if len(pendientes) == cantidad_pendientes:
+                    bloqueadas = ", ".join(
+                        f"'{nombre}' (depende de {', '.join(dependencias)})"
+                        for nombre, (dependencias, _) in pendientes.items()
+                    )
+                    raise ValueError(f"Pruebas que nunca pueden ejecutarse: {bloqueadas}")
+                continue
+            
+            terminadas, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminadas:
+                resultados[en_curso.pop(futuro)] = futuro.result()
+    
+    return resultados
 
 
 def main():
@@ -269,68 +458,25 @@ def main():
     print("="*60 + "\n")
     
     # 1. Health Check
-    if not test_health_check():
+    if not SKIP_HEALTHCHECK and not ejecutar(api_disponible):
         print_error("La API no está disponible. Abortando pruebas.")
         return
     
-    print("\n" + "-"*60 + "\n")
-    
-    # 2. Registro
-    user = test_register_user()
-    if not user:
-        print_error("No se pudo registrar usuario. Abortando pruebas.")
-        return
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 3. Login
-    token = test_login(user['email'], "password123")
-    if not token:
-        print_error("No se pudo hacer login. Abortando pruebas.")
-        return
+    separador()
     
-    print("\n" + "-"*60 + "\n")
-    
-    # 4. Obtener Perfil
-    test_get_profile(token)
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 5. Crear Producto
-    product = test_create_product(token)
-    if not product:
-        print_error("No se pudo crear producto. Abortando pruebas.")
-        return
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 6. Listar Productos
-    test_list_products(token)
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 7. Actualizar Stock
-    test_update_stock(token, product['id'])
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 8. Registrar Venta
-    sale = test_create_sale(token, product['id'])
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 9. Listar Ventas
-    test_list_sales(token)
-    
-    print("\n" + "-"*60 + "\n")
-    
-    # 10. Estadísticas
-    test_sales_stats(token)
+    # 2. El resto de las pruebas, en paralelo según sus dependencias
+    resultados = ejecutar_pruebas(PRUEBAS)
     
     print("\n" + "="*60)
     print("✅ TODAS LAS PRUEBAS COMPLETADAS")
     print("="*60 + "\n")
     
+    user = resultados["registro"]
+    product = resultados["crear_producto"]
+    if not (user and product):
+        print_error("No se pudieron crear los datos de prueba.")
+        return
+    
     print_info("Datos de prueba creados:")
     print(f"  • Email: {user['email']}")
     print(f"  • API Key: {user['api_key']}")